@@ -1,58 +1,77 @@
+import os
 import numpy as np
+import atexit
+import threading
 import dectree
-import pandas as pd
-import itertools
+import treecache
+import gamefeatures
+import sessions
+from rules import outcome, win_from, win_with
+import strategies
 
-from flask import Flask
+from flask import Flask, request, jsonify
 from flask_cors import CORS
 app = Flask(__name__)
 CORS(app)
 
-def outcome(pl1, pl2):
-    return "draw" if pl1==pl2 else "win" if (pl1=="rock" and pl2=="scissors") or (pl1=="paper" and pl2=="rock") or (pl1=="scissors" and pl2=="paper") else "loss"
-
-def win_from(action):
-    return "rock" if action=="scissors" else "paper" if action=="rock" else "scissors"
-
-def win_with(result, action):
-    return "rock" if (result=="win" and action=="scissors") or (result=="draw" and action=="rock") or (result=="loss" and action=="paper") else "paper" if (result=="win" and action=="rock") or (result=="draw" and action=="paper") or (result=="loss" and action=="scissors") else "scissors"
-
-
-
-
-
 # Globals
-PREDICTED_PLAYER_ACTION = np.random.choice(['rock', 'paper', 'scissors'])
-LAST_AI_ACTION          = win_from(PREDICTED_PLAYER_ACTION)
-
-pl_hist, ou_hist, pr_hist, ai_hist = dectree.loadGameHistory()
-trees   = []
-pl_game = []
-ou_game = []
-pr_game = []
-ai_game = []
+# strategies every game runs unless /newGame?strategies=... names others
+STRATEGIES = os.environ.get("AI_STRATEGIES", ",".join(strategies.DEFAULT)).split(",")
+# "best" or "weighted", see strategies.Selector
+SELECTION  = os.environ.get("AI_SELECTION", "best")
+history = treecache.TreeCache(asynchronous=True)
+atexit.register(history.close)
+shared  = strategies.Shared(history)
+shared.contexts.sync()
+if "dectree" in STRATEGIES:
+    for nturns in (1, 2):
+        history.get(nturns)
+
+class GameState(object):
+    """
+    One player's game in progress, kept as a gamefeatures.GameFeatures
+    (one byte per move and stream) that the strategies share
+    """
+
+    def __init__(self, names=None):
+        self.lock      = threading.Lock()
+        self.predicted = np.random.choice(['rock', 'paper', 'scissors'])
+        self.last_ai   = win_from(self.predicted)
+        self.features  = gamefeatures.GameFeatures()
+        self.selector  = strategies.Selector(names or STRATEGIES, self.features, shared, mode=SELECTION)
+
+    def __len__(self):
+        return len(self.features)
+
+    def record(self, player):
+        """
+        Records the player's action against the AI's last action
+        """
+        self.features.appendLabels(player, outcome(player, self.last_ai), self.predicted, self.last_ai)
+
+    def game(self):
+        """
+        Returns the game as lists of labels, as the dectree history uses
+        """
+        return self.features.labels()
+
+def saveGame(session_id, state):
+    with state.lock:
+        if len(state) < 20:
+            return
+        pl_game, ou_game, pr_game, ai_game = state.game()
+    history.append(pl_game, ou_game, pr_game, ai_game)
+
+games = sessions.SessionStore(GameState, on_evict=saveGame)
 
 @app.route('/newGame', methods=['POST','GET','OPTIONS'])
 def newGame():
 
-    global LAST_AI_ACTION, PREDICTED_PLAYER_ACTION
-    global pl_hist, ou_hist, pr_hist, ai_hist, trees
-    global pl_game, ou_game, pr_game, ai_game, tree
-
-    PREDICTED_PLAYER_ACTION = np.random.choice(['rock', 'paper', 'scissors'])
-    LAST_AI_ACTION          = win_from(PREDICTED_PLAYER_ACTION)
-
-    if len(pl_game) >= 20 and dectree.checkGameIntegrity(pl_game,ou_game,pr_game,ai_game):
-        pl_hist.append(pl_game)
-        ou_hist.append(ou_game)
-        pr_hist.append(pr_game)
-        ai_hist.append(ai_game)
-        dectree.saveGameHistory(pl_hist, ou_hist, pr_hist, ai_hist)
-    pl_game = []
-    ou_game = []
-    pr_game = []
-    ai_game = []
-    tr_game = None
+    session_id = sessions.sessionId(request)
+    names = request.args.get("strategies")
+    state = games.reset(session_id, names.split(",") if names else None)
+    if state is not None:
+        saveGame(session_id, state)
 
     return "AI ready"
 
@@ -64,61 +83,43 @@ def newGame():
 @app.route('/getAction/<string:player>', methods=['POST','GET','OPTIONS'])
 def getAction(player):
 
-    global LAST_AI_ACTION, PREDICTED_PLAYER_ACTION
-    global pl_hist, ou_hist, pr_hist, ai_hist, trees
-    global pl_game, ou_game, pr_game, ai_game
+    state = games.get(sessions.sessionId(request))
+    with state.lock:
+        return nextAction(state, player)
+
+def nextAction(state, player):
 
     # Update the game data
     if player is None:
-        return LAST_AI_ACTION
+        return state.last_ai
     player = player.lower()
     if player not in ['rock', 'paper', 'scissors']:
         print("\nCheater. %s not one out of rock/paper/scissors\n"%(str(player)))
-        return LAST_AI_ACTION
-    pl_game.append(player)
-    ou_game.append(outcome(player, LAST_AI_ACTION))
-    pr_game.append(PREDICTED_PLAYER_ACTION)
-    ai_game.append(LAST_AI_ACTION)
-
-    # Get prediction from historical games
-    ndatapoints = len(pl_game)
-
-    if ndatapoints <= 1:
-        nturns = 1
-        trees = dectree.buildDectrees(pl_hist, ou_hist, pr_hist, ai_hist, nturns)
-        if len(trees) > 0:
-            point = dectree.buildDatapoint(pl_game, ou_game, pr_game, ai_game, nturns, -1)
-            p = [t.predict(point) for t in trees]
-            PREDICTED_PLAYER_ACTION = pd.value_counts(p).index[0]
-            print("Only %d other trees based"%(len(trees)), pd.value_counts(p))
-        else:
-            PREDICTED_PLAYER_ACTION = np.random.choice(['rock', 'paper', 'scissors'])
-            print("Random", PREDICTED_PLAYER_ACTION)
+        return state.last_ai
+    state.record(player)
+
+    predicted = state.selector.step(dectree.ACTIONS.index(player))
+    if predicted is None:
+        state.predicted = np.random.choice(['rock', 'paper', 'scissors'])
+        print("Random", state.predicted)
     else:
-        nturns  = 1 if ndatapoints <= 5 else 2# if ndatapoints <= 10 else 3
-        point   = dectree.buildDatapoint(pl_game, ou_game, pr_game, ai_game, nturns,-1)
-        tree    = dectree.buildDectree(pl_game, ou_game, pr_game, ai_game, nturns)
-        targets = tree.targets(point)
-        weights = np.ones(len(targets))
-        print("this tree\n", pd.value_counts(targets))
-        trees  = dectree.buildDectrees(pl_hist, ou_hist, pr_hist, ai_hist, nturns)
-        if len(trees) > 0:
-            datapoints, datatargets  = dectree.buildDatapoints(pl_game, ou_game, pr_game, ai_game, nturns)
-            w = [np.sum([t.predict(p)==r for p,r in zip(datapoints, datatargets)], dtype=float)/len(targets) for t in trees]
-            t = [t.predict(point) for t in trees]
-            f = pd.DataFrame(list(zip(t, w)), columns=['rps','w'])
-            g = f.groupby('rps', as_index=False).sum()
-            print("%d other trees based\n"%(len(trees)), g)
-            weights = list(itertools.chain( *(weights, w) ))
-            targets = list(itertools.chain( *(targets, t) ))
-        f = pd.DataFrame(list(zip(targets,weights)), columns=['rps','w'])
-        g = f.groupby('rps', as_index=False).sum()
-        PREDICTED_PLAYER_ACTION = g.ix[g['w'].idxmax()]['rps']
-        print("%d other trees and this based\n"%(len(trees)), g)
-
-
-    LAST_AI_ACTION = win_from(PREDICTED_PLAYER_ACTION)
-    return LAST_AI_ACTION
+        state.predicted = predicted
+        print("Predicted %s"%(predicted), state.selector.report())
+
+    state.last_ai = win_from(state.predicted)
+    return state.last_ai
+
+@app.route('/strategies', methods=['GET'])
+def strategyReport():
+    """
+    Reports the strategies: what is available, how the current session's
+    ones are doing and their totals over all sessions
+    """
+    state = games.get(sessions.sessionId(request))
+    with state.lock:
+        session = state.selector.report()
+    return jsonify(available=list(strategies.REGISTRY), default=STRATEGIES, selection=SELECTION,
+                   session=session, totals=strategies.STATS.report())
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000)
+    app.run(host='0.0.0.0', port=5000, threaded=True)
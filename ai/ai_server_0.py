@@ -1,42 +1,48 @@
 import numpy as np
+import threading
 #import dectree
-import pandas as pd
+import sessions
+from rules import outcome, win_from, win_with
+import patternindex
 
-from flask import Flask
+from flask import Flask, request
 from flask_cors import CORS
 app = Flask(__name__)
 CORS(app)
 
 
 
-def outcome(pl1, pl2):
-    return "draw" if pl1==pl2 else "win" if (pl1=="rock" and pl2=="scissors") or (pl1=="paper" and pl2=="rock") or (pl1=="scissors" and pl2=="paper") else "loss"
-
-def win_from(action):
-    return "rock" if action=="scissors" else "paper" if action=="rock" else "scissors"
-
-def win_with(result, action):
-    return "rock" if (result=="win" and action=="scissors") or (result=="draw" and action=="rock") or (result=="loss" and action=="paper") else "paper" if (result=="win" and action=="rock") or (result=="draw" and action=="paper") or (result=="loss" and action=="scissors") else "scissors"
+# Globals
+ACTIONS = ['rock', 'paper', 'scissors']
+# number of past outcomes matched against the history, 1 is the original rule
+CONTEXT = 1
 
+class GameState(object):
+    """
+    One player's game in progress, kept as a patternindex.PatternIndex
+    over the played rounds
+    """
 
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.predicted = np.random.choice(ACTIONS)
+        self.last_ai   = win_from(self.predicted)
+        self.index     = patternindex.PatternIndex(CONTEXT)
 
+    def __len__(self):
+        return len(self.index)
 
+    def append(self, player, ai):
+        self.index.append(ACTIONS.index(player), ACTIONS.index(ai))
 
-# Globals
-PREDICTED_PLAYER_ACTION = np.random.choice(['rock', 'paper', 'scissors'])
-LAST_AI_ACTION          = win_from(PREDICTED_PLAYER_ACTION)
-GAME_HISTORY            = []
+games = sessions.SessionStore(GameState)
 
 
 @app.route('/newGame', methods=['POST','GET','OPTIONS'])
 #@crossdomain(origin="*")
 def newGame():
 
-    global LAST_AI_ACTION, PREDICTED_PLAYER_ACTION, GAME_HISTORY
-
-    GAME_HISTORY            = []
-    PREDICTED_PLAYER_ACTION = np.random.choice(['rock', 'paper', 'scissors'])
-    LAST_AI_ACTION          = win_from(PREDICTED_PLAYER_ACTION)
+    games.reset(sessions.sessionId(request))
 
     return "AI ready"
 
@@ -49,35 +55,28 @@ def newGame():
 #@crossdomain(origin="*")
 def getAction(player):
     print("player played %s"%player)
-    global LAST_AI_ACTION, PREDICTED_PLAYER_ACTION, GAME_HISTORY
+    state = games.get(sessions.sessionId(request))
+    with state.lock:
+        return nextAction(state, player)
+
+def nextAction(state, player):
 
     if player is None:
-        return LAST_AI_ACTION
+        return state.last_ai
     player = player.lower()
     if player not in ['rock', 'paper', 'scissors']:
         print("Cheater. %s not in rock/paper/scissors"%(player))
-        return LAST_AI_ACTION
+        return state.last_ai
 
-    GAME_HISTORY.append({"ai":LAST_AI_ACTION, "player":player})
-    if len(GAME_HISTORY) <= 1:
-        PREDICTED_PLAYER_ACTION = np.random.choice(['rock', 'paper', 'scissors'])
+    state.append(player, state.last_ai)
+    if len(state) <= 1:
+        state.predicted = np.random.choice(['rock', 'paper', 'scissors'])
     else:
-        player_last_outcome = outcome(player, LAST_AI_ACTION)
-        found_match = False
-        for i in range(len(GAME_HISTORY)-1, 0, -1):
-            player_outcome = outcome(GAME_HISTORY[i-1]['player'],GAME_HISTORY[i-1]['ai'])
-            if player_outcome == player_last_outcome:
-                player_wtl = outcome(GAME_HISTORY[i]['player'],GAME_HISTORY[i-1]['ai'])
-                PREDICTED_PLAYER_ACTION  = win_with(player_wtl,GAME_HISTORY[-1]['ai'])
-                found_match = True
-                break
-        if found_match == False:
-            player_wtl     = outcome(GAME_HISTORY[-1]['player'],GAME_HISTORY[-2]['ai'])
-            PREDICTED_PLAYER_ACTION  = win_with(player_wtl, GAME_HISTORY[-1]['ai'])
-    LAST_AI_ACTION = win_from(PREDICTED_PLAYER_ACTION)
-    print("AI returns %s"%LAST_AI_ACTION)
-    return LAST_AI_ACTION
+        state.predicted = ACTIONS[state.index.predict()]
+    state.last_ai = win_from(state.predicted)
+    print("AI returns %s"%state.last_ai)
+    return state.last_ai
 
 
 if __name__ == "__main__":
-    app.run(port=5000, debug=False)
+    app.run(port=5000, debug=False, threaded=True)
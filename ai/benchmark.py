@@ -0,0 +1,215 @@
+"""
+Latency benchmark and load generator for the AI servers.
+
+    python benchmark.py -games 1000 -style wsls -players 8 -o results.json
+
+Synthesizes a game history of the requested size and player style in a
+scratch directory, imports the servers there and plays bot sessions
+against /newGame and /getAction, both in-process through the Flask test
+client and over HTTP with concurrent local clients. Reports p50/p95/p99
+latency per endpoint, throughput and memory, and writes everything to a
+JSON file so runs on different commits can be compared.
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+import numpy as np
+
+AI_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, AI_DIR)
+
+import bots
+import gamelog
+
+def synthesizeHistory(ngames, length, style, seed=0):
+    """
+    Writes ngames synthetic games of the given bot style to the game log
+    in the current directory
+    """
+    log = gamelog.GameLog()
+    packed = []
+    for i in range(ngames):
+        bot = bots.BOTS[style](seed + i)
+        packed.append(gamelog.pack(*bots.synthesizeGame(bot, length, seed + i)))
+    if packed:
+        log.appendPacked(packed)
+    return log
+
+def memory():
+    """
+    Returns the current and peak resident set size in kB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except (IOError, OSError):
+        current = None
+    return current, peak
+
+def summarize(latencies):
+    if len(latencies) == 0:
+        return {"count": 0}
+    ms = np.array(latencies) * 1000.0
+    return {
+        "count": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+def playSession(get, session, moves, bot, latencies):
+    """
+    Plays one game of moves rounds as bot through get(path), recording
+    the latency of every request per endpoint
+    """
+    def timed(endpoint, path):
+        t = time.perf_counter()
+        answer = get(path)
+        latencies[endpoint].append(time.perf_counter() - t)
+        return answer
+    timed("newGame", "/newGame?session=%s"%(session))
+    ai = timed("getAction", "/getAction?session=%s"%(session))
+    player = bot.first()
+    for _ in range(moves):
+        answer = timed("getAction", "/getAction/%s?session=%s"%(player, session))
+        player = bot.next(player, ai)
+        ai = answer
+
+def runPlayers(clients, sessions_per_client, moves, style, seed):
+    """
+    Runs one thread per client, each playing sessions_per_client games.
+    clients is a list of get(path) functions
+    """
+    latencies = [{"newGame": [], "getAction": []} for _ in clients]
+    def run(k):
+        for s in range(sessions_per_client):
+            playSession(clients[k], "bench-%d-%d"%(k, s), moves, bots.BOTS[style](seed + 1000*k + s), latencies[k])
+    threads = [threading.Thread(target=run, args=(k,)) for k in range(len(clients))]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duration = time.perf_counter() - start
+    merged = dict((e, sum([l[e] for l in latencies], [])) for e in ("newGame", "getAction"))
+    nrequests = sum(len(v) for v in merged.values())
+    return {
+        "duration_s": duration,
+        "requests": nrequests,
+        "throughput_rps": nrequests / duration if duration > 0 else None,
+        "endpoints": dict((e, summarize(v)) for e, v in merged.items()),
+    }
+
+def inProcessClients(app, n):
+    def client():
+        c = app.test_client()
+        return lambda path: c.get(path).get_data(as_text=True)
+    return [client() for _ in range(n)]
+
+@contextlib.contextmanager
+def httpServer(app):
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield "http://127.0.0.1:%d"%(server.server_port)
+    finally:
+        server.shutdown()
+
+def httpClients(url, n):
+    def get(path):
+        return urlopen(url + path).read().decode("utf-8")
+    return [get for _ in range(n)]
+
+def gitCommit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=AI_DIR, stderr=subprocess.STDOUT).decode().strip()
+    except Exception:
+        return None
+
+def benchmark(arguments):
+    results = []
+    for name in arguments.servers:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            t = time.perf_counter()
+            server = importlib.import_module(name)
+            startup = time.perf_counter() - t
+            for mode in arguments.modes:
+                if mode == "inprocess":
+                    run = runPlayers(inProcessClients(server.app, arguments.players), arguments.sessions, arguments.moves, arguments.style, arguments.seed)
+                else:
+                    with httpServer(server.app) as url:
+                        run = runPlayers(httpClients(url, arguments.players), arguments.sessions, arguments.moves, arguments.style, arguments.seed)
+                current, peak = memory()
+                run.update({"server": name, "mode": mode, "startup_s": startup, "rss_kb": current, "max_rss_kb": peak})
+                results.append(run)
+        close = getattr(getattr(server, "history", None), "close", None)
+        if close is not None:
+            close()
+    return results
+
+def report(results):
+    for r in results:
+        print("%-12s %-9s startup %7.3fs  %8.1f req/s  rss %s kB"%(r["server"], r["mode"], r["startup_s"], r["throughput_rps"] or 0, r["rss_kb"]))
+        for endpoint, s in sorted(r["endpoints"].items()):
+            if s["count"] > 0:
+                print("    %-10s n=%-6d p50 %7.2fms  p95 %7.2fms  p99 %7.2fms"%(endpoint, s["count"], s["p50_ms"], s["p95_ms"], s["p99_ms"]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the AI servers")
+    parser.add_argument("-servers", nargs="+", default=["ai_server", "ai_server_0"], choices=["ai_server", "ai_server_0"])
+    parser.add_argument("-modes", nargs="+", default=["inprocess", "http"], choices=["inprocess", "http"])
+    parser.add_argument("-games", type=int, default=200, help="number of games in the synthetic history")
+    parser.add_argument("-length", type=int, default=50, help="rounds per synthetic game")
+    parser.add_argument("-style", default="random", choices=sorted(bots.BOTS.keys()), help="player style of the history and the clients")
+    parser.add_argument("-players", type=int, default=4, help="concurrent clients")
+    parser.add_argument("-sessions", type=int, default=2, help="games played by every client")
+    parser.add_argument("-moves", type=int, default=50, help="moves per game played")
+    parser.add_argument("-seed", type=int, default=0)
+    parser.add_argument("-workdir", default=None, help="directory for the synthetic history (default: a temporary one)")
+    parser.add_argument("-o", dest="output", default="benchmark.json", help="JSON file to write the results to")
+    arguments = parser.parse_args()
+
+    output  = os.path.abspath(arguments.output)
+    workdir = arguments.workdir or tempfile.mkdtemp(prefix="rps-benchmark-")
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    os.chdir(workdir)
+    t = time.perf_counter()
+    synthesizeHistory(arguments.games, arguments.length, arguments.style, arguments.seed)
+    print("Synthesized %d %s games of %d rounds in %s (%.2fs)"%(arguments.games, arguments.style, arguments.length, workdir, time.perf_counter() - t))
+
+    results = benchmark(arguments)
+    report(results)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": gitCommit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": vars(arguments),
+            "results": results,
+        }, f, indent=2)
+    print("Results written to %s"%(output))
@@ -0,0 +1,69 @@
+import numpy as np
+from rules import outcome, win_from
+
+ACTIONS = ['rock', 'paper', 'scissors']
+BEATS   = dict((a, win_from(a)) for a in ACTIONS)
+
+class Bot(object):
+    """
+    A synthetic player. first() gives the opening action, next(player, ai)
+    the action after a round in which the bot played player against ai
+    """
+
+    def __init__(self, seed=None):
+        self.rng = np.random.RandomState(seed)
+
+    def first(self):
+        return ACTIONS[self.rng.randint(3)]
+
+    def next(self, player, ai):
+        return ACTIONS[self.rng.randint(3)]
+
+class RandomBot(Bot):
+    pass
+
+class CyclicBot(Bot):
+    """
+    Plays rock, paper, scissors, rock, ... with some noise
+    """
+
+    def __init__(self, seed=None, noise=0.1):
+        Bot.__init__(self, seed)
+        self.noise = noise
+
+    def next(self, player, ai):
+        if self.rng.rand() < self.noise:
+            return ACTIONS[self.rng.randint(3)]
+        return BEATS[player]
+
+class WinStayLoseShiftBot(Bot):
+    """
+    Repeats a winning action, otherwise switches to what would have won
+    """
+
+    def next(self, player, ai):
+        return player if outcome(player, ai) == "win" else BEATS[ai]
+
+BOTS = {
+    'random': RandomBot,
+    'cyclic': CyclicBot,
+    'wsls':   WinStayLoseShiftBot,
+}
+
+def synthesizeGame(bot, length, seed=None):
+    """
+    Plays bot against a uniformly random AI for length rounds and returns
+    the game as lists of labels: player, outcome, prediction, ai
+    """
+    rng = np.random.RandomState(seed)
+    pl, ou, pr, ai = [], [], [], []
+    player = bot.first()
+    for _ in range(length):
+        predicted = ACTIONS[rng.randint(3)]
+        action    = BEATS[predicted]
+        pl.append(player)
+        ou.append(outcome(player, action))
+        pr.append(predicted)
+        ai.append(action)
+        player = bot.next(player, action)
+    return pl, ou, pr, ai
@@ -0,0 +1,52 @@
+import numpy as np
+
+# paper, rock, scissors
+NCLASSES = 3
+
+def bincount(codes, nclasses=NCLASSES):
+    """
+    Counts class codes into nclasses slots, skipping negative (missing)
+    codes
+    """
+    codes = np.asarray(codes, dtype=np.intp)
+    return np.bincount(codes[codes >= 0], minlength=nclasses)
+
+def weighted(codes, weights, nclasses=NCLASSES):
+    """
+    Sums the weights per class code, skipping negative (missing) codes
+    """
+    codes   = np.asarray(codes, dtype=np.intp)
+    weights = np.broadcast_to(np.asarray(weights, dtype=float), codes.shape)
+    keep    = codes >= 0
+    return np.bincount(codes[keep], weights=weights[keep], minlength=nclasses)
+
+def argmax(counts, order=None):
+    """
+    Returns the index of the largest count. Ties go to the class ranked
+    first by order (e.g. the position of its first appearance), or to the
+    lowest index
+    """
+    counts = np.asarray(counts)
+    top = np.flatnonzero(counts == counts.max())
+    if order is None or len(top) == 1:
+        return int(top[0])
+    return int(top[np.argmin(np.asarray(order)[top])])
+
+def unique(values):
+    """
+    Returns the distinct values in order of first appearance, as
+    pd.unique does
+    """
+    return list(dict.fromkeys(values))
+
+def value_counts(values):
+    """
+    Returns the distinct values and their counts, most frequent first and
+    ties in order of first appearance, as pd.value_counts does
+    """
+    index  = {}
+    codes  = np.array([index.setdefault(v, len(index)) for v in values], dtype=np.intp)
+    labels = list(index)
+    counts = np.bincount(codes, minlength=len(labels))
+    order  = np.argsort(-counts, kind='stable')
+    return [labels[i] for i in order], counts[order]
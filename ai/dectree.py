@@ -1,13 +1,18 @@
+import copy
 import numpy as np
-import pandas as pd
+import classcounts
 from numbers import Number
 import math
 
+ACTIONS  = ['paper', 'rock', 'scissors']
+OUTCOMES = ['draw', 'loss', 'win']
+SYMBOLS  = ACTIONS + OUTCOMES
+
 def gini(elements):
     """
     Calculates the total gini impurity of a group of elements
     """
-    f = pd.value_counts(elements)/len(elements)
+    f = classcounts.value_counts(elements)[1]/len(elements)
     G = f * (1.0 - f)
     return G.sum()
 
@@ -26,7 +31,7 @@ def split_level(data, target, min_samples_leaf=3):
         feature_values = np.array(data[feature])
         if len(feature_values) != len(target):
             raise ValueError("Feature data length unequal to target length")
-        unique_feature_values = pd.unique(feature_values)
+        unique_feature_values = classcounts.unique(feature_values)
         if len(unique_feature_values) <= 1:
             continue
         if np.all([isinstance(x, Number) for x in unique_feature_values]):
@@ -57,6 +62,72 @@ def split_level(data, target, min_samples_leaf=3):
                     value  = cv
     return score, column, value
 
+def encode(values, labels=SYMBOLS):
+    """
+    Encodes a sequence of labels as indices into labels, -1 for missing
+    or unknown values
+    """
+    lookup = dict((l, i) for i, l in enumerate(labels))
+    return np.array([lookup.get(v, -1) for v in values], dtype=np.intp)
+
+def gini_counts(counts):
+    """
+    Calculates the gini impurity from class counts along the last axis.
+    Frequencies are summed in descending order, as gini() does, so both
+    give exactly the same score
+    """
+    counts = np.asarray(counts)
+    n = np.maximum(counts.sum(axis=-1, keepdims=True), 1)
+    f = -np.sort(-counts, axis=-1) / n
+    return (f * (1.0 - f)).sum(axis=-1)
+
+def encode_data(data):
+    """
+    Encodes categorical data as an (nfeatures, nsamples) array of small
+    integers. Returns the codes and the labels they index, or None when
+    the data holds numbers or missing values
+    """
+    if len(data) == 0:
+        return None
+    nsamples = len(data[0])
+    values = []
+    for row in data:
+        if len(row) != nsamples:
+            raise ValueError("Feature data length unequal to target length")
+        values.extend(row)
+    if nsamples == 0 or np.any([x is None or isinstance(x, Number) for x in values]):
+        return None
+    labels, codes = np.unique(values, return_inverse=True)
+    return codes.reshape(len(data), nsamples), labels
+
+def split_level_codes(data, target, nlabels, nclasses, min_samples_leaf=3):
+    """
+    Integer-encoded split_level for categorical features. data holds the
+    feature codes as an (nfeatures, nsamples) array, target the class
+    codes. All candidate splits are scored at once from one class-count
+    histogram; ties resolve like split_level (first feature, then first
+    appearance of the value)
+    """
+    nfeatures, nsamples = data.shape
+    cells  = data + (np.arange(nfeatures) * nlabels)[:, np.newaxis]
+    hist   = np.bincount((cells * nclasses + target).ravel(), minlength=nfeatures*nlabels*nclasses)
+    hist   = hist.reshape(nfeatures, nlabels, nclasses)
+    total  = np.bincount(target, minlength=nclasses)
+    n_in   = hist.sum(axis=2)
+    n_out  = nsamples - n_in
+    valid  = (n_in >= max(min_samples_leaf, 1)) & (n_out >= min_samples_leaf)
+    valid &= ((n_in > 0).sum(axis=1) > 1)[:, np.newaxis]
+    if not valid.any():
+        return None, None, None
+    scores = gini_counts(hist) + gini_counts(total - hist)
+    score  = scores[valid].min()
+    column = np.argmax((valid & (scores == score)).any(axis=1))
+    values = np.flatnonzero(valid[column] & (scores[column] == score))
+    if len(values) > 1:
+        first  = [np.argmax(data[column] == v) for v in values]
+        values = values[np.argsort(first, kind='stable')]
+    return score, column, values[0]
+
 def split(data, target, feature, value):
     """
     Split data at column i at value
@@ -86,6 +157,44 @@ class Dectree(object):
             self.__l = True
             self.__t = None
             return
+        encoded = encode_data(data)
+        if encoded is None:
+            self.__fit(data, target)
+        else:
+            classes, codes = np.unique(np.array(target), return_inverse=True)
+            if len(codes) != encoded[0].shape[1]:
+                raise ValueError("Feature data length unequal to target length")
+            self.fit_codes(encoded[0], codes, encoded[1], classes)
+
+    def fit_codes(self, data, target, labels, classes):
+        """
+        Fits on integer-encoded categorical data: data is an (nfeatures,
+        nsamples) array of indices into labels, target an array of indices
+        into classes. Grows the same tree as fit on the decoded data
+        """
+        if self.max_depth <= 0 or len(target) < self.min_samples_split:
+            self.__l = True
+            self.__t = classes[target]
+            return
+        if gini_counts(classcounts.bincount(target, len(classes))) < self.min_impurity_split:
+            self.__l = True
+            self.__t = classes[target]
+            return
+        s, c, v = split_level_codes(data, target, len(labels), len(classes), self.min_samples_leaf)
+        if s is None:
+            self.__l = True
+            self.__t = classes[target]
+            return
+        self.__l = False
+        self.__c = int(c)
+        self.__v = labels[v]
+        mask = data[c] == v
+        self.__n1 = Dectree(self.max_depth-1, self.min_samples_split, self.min_samples_leaf, self.min_impurity_split)
+        self.__n2 = Dectree(self.max_depth-1, self.min_samples_split, self.min_samples_leaf, self.min_impurity_split)
+        self.__n1.fit_codes(data[:, mask], target[mask], labels, classes)
+        self.__n2.fit_codes(data[:, ~mask], target[~mask], labels, classes)
+
+    def __fit(self, data, target):
         target = np.array(target)
         if self.max_depth <= 0 or len(target) < self.min_samples_split:
             self.__l = True
@@ -107,8 +216,8 @@ class Dectree(object):
         d1, d2, t1, t2 = split(data, target, c, v)
         self.__n1 = Dectree(self.max_depth-1, self.min_samples_split, self.min_samples_leaf, self.min_impurity_split)
         self.__n2 = Dectree(self.max_depth-1, self.min_samples_split, self.min_samples_leaf, self.min_impurity_split)
-        self.__n1.fit(d1, t1)
-        self.__n2.fit(d2, t2)
+        self.__n1.__fit(d1, t1)
+        self.__n2.__fit(d2, t2)
 
     def targets(self, x):
         if self.__l == True:
@@ -132,8 +241,7 @@ class Dectree(object):
         if t is None or len(t) == 0:
             return None
         else:
-            vc = pd.value_counts(t)
-            return vc.index.values[0]
+            return classcounts.value_counts(t)[0][0]
 
     def draw(self, offset=""):
         if self.__l == True:
@@ -141,7 +249,7 @@ class Dectree(object):
             if self.__t is None:
                 print("NONE")
             else:
-                for k,v in pd.value_counts(self.__t).iteritems():
+                for k,v in zip(*classcounts.value_counts(self.__t)):
                     print("%s+ %s - %d"%(offset, str(k), v))
         else:
             print("%sNODE"%(offset))
@@ -149,6 +257,250 @@ class Dectree(object):
             self.__n1.draw(offset+"__")
             self.__n2.draw(offset+"__")
 
+    def compile(self, classes=ACTIONS, labels=SYMBOLS):
+        """
+        Flattens the fitted tree into a CompiledDectree for fast inference
+        """
+        return CompiledDectree(self.__flatten([]), classes, labels)
+
+    def __flatten(self, nodes):
+        """
+        Appends the nodes of this tree to nodes in preorder, as tuples of
+        (column, value, index of n1, index of n2, leaf targets)
+        """
+        i = len(nodes)
+        if self.__l == True:
+            nodes.append((-1, None, -1, -1, self.__t))
+        else:
+            nodes.append(None)
+            n1 = len(nodes)
+            self.__n1.__flatten(nodes)
+            n2 = len(nodes)
+            self.__n2.__flatten(nodes)
+            nodes[i] = (self.__c, self.__v, n1, n2, None)
+        return nodes
+
+class CompiledDectree(object):
+    """
+    A fitted Dectree flattened into parallel arrays indexed by node:
+    feature (-1 at leaves), split value (both as label and as code into
+    labels), child indices and the class counts of the targets below each
+    node. predict gives the same answers as Dectree.predict, including
+    the tie-breaking on first appearance
+    """
+
+    def __init__(self, nodes, classes=ACTIONS, labels=SYMBOLS):
+        self.classes = np.array(classes)
+        self.labels  = np.array(labels)
+        class_index  = dict((c, i) for i, c in enumerate(classes))
+        label_index  = dict((l, i) for i, l in enumerate(labels))
+        nnodes       = len(nodes)
+        nclasses     = len(classes)
+        self.feature   = np.array([n[0] for n in nodes], dtype=np.intp)
+        self.value     = np.array([label_index.get(n[1], -2) for n in nodes], dtype=np.intp)
+        self.numeric   = np.array([isinstance(n[1], Number) for n in nodes])
+        self.threshold = np.array([n[1] if isinstance(n[1], Number) else np.nan for n in nodes], dtype=float)
+        self.n1        = np.array([n[2] for n in nodes], dtype=np.intp)
+        self.n2        = np.array([n[3] for n in nodes], dtype=np.intp)
+        self.counts    = np.zeros((nnodes, nclasses), dtype=np.intp)
+        # position of the first target of each class below a node, used to
+        # break ties the way Dectree.predict does
+        first = np.full((nnodes, nclasses), np.inf)
+        depth = np.zeros(nnodes, dtype=np.intp)
+        for i in range(nnodes-1, -1, -1):
+            c, v, n1, n2, t = nodes[i]
+            if c < 0:
+                if t is not None and len(t) > 0:
+                    codes = np.array([class_index[x] for x in t], dtype=np.intp)
+                    self.counts[i] = classcounts.bincount(codes, nclasses)
+                    present = self.counts[i] > 0
+                    first[i, present] = [np.argmax(codes == k) for k in np.flatnonzero(present)]
+            else:
+                self.counts[i] = self.counts[n1] + self.counts[n2]
+                first[i] = np.where(np.isfinite(first[n1]), first[n1], self.counts[n1].sum() + first[n2])
+                depth[i] = 1 + max(depth[n1], depth[n2])
+        top = self.counts == self.counts.max(axis=1, keepdims=True)
+        self.prediction = np.where(self.counts.sum(axis=1) > 0, np.argmin(np.where(top, first, np.inf), axis=1), -1)
+        self.depth = int(depth[0]) if nnodes > 0 else 0
+        # plain lists make the scalar walk in predict much cheaper
+        self.__walk = list(zip(self.feature.tolist(), [n[1] for n in nodes], self.numeric.tolist(), self.n1.tolist(), self.n2.tolist()))
+        self.__prediction = [None if p < 0 else self.classes[p] for p in self.prediction]
+
+    def leaf(self, x):
+        """
+        Returns the node x ends up in. Stops early at a node whose feature
+        is missing from x, like Dectree.targets does
+        """
+        node = 0
+        c, v, numeric, n1, n2 = self.__walk[node]
+        while c >= 0:
+            if x is None or len(x) <= c or x[c] is None:
+                break
+            if numeric and isinstance(x[c], Number):
+                node = n1 if x[c] >= v else n2
+            else:
+                node = n1 if x[c] == v else n2
+            c, v, numeric, n1, n2 = self.__walk[node]
+        return node
+
+    def targets(self, x):
+        """
+        Returns the class counts of the targets Dectree.targets would give
+        """
+        return self.counts[self.leaf(x)]
+
+    def predict(self, x):
+        return self.__prediction[self.leaf(x)]
+
+    def leaf_batch(self, X):
+        """
+        Routes all rows of X at once and returns the node each ends up in.
+        X holds feature codes into labels, with -1 for missing features
+        """
+        X = np.asarray(X)
+        if X.ndim != 2:
+            X = X.reshape(len(X), int(np.prod(X.shape[1:])))
+        nrows, nfeatures = X.shape
+        node = np.zeros(nrows, dtype=np.intp)
+        rows = np.arange(nrows)
+        for _ in range(self.depth):
+            c = self.feature[node]
+            active = np.flatnonzero((c >= 0) & (c < nfeatures))
+            if len(active) == 0:
+                break
+            n = node[active]
+            x = X[rows[active], c[active]]
+            go = np.where(self.numeric[n], x >= self.threshold[n], x == self.value[n])
+            node[active] = np.where(x < 0, n, np.where(go, self.n1[n], self.n2[n]))
+            if np.all(x < 0):
+                break
+        return node
+
+    def predict_batch(self, X):
+        """
+        Predicts every row of X at once. Returns indices into classes,
+        -1 where Dectree.predict would return None
+        """
+        return self.prediction[self.leaf_batch(X)]
+
+    def structure(self):
+        """
+        Returns a hashable key of the split structure, ignoring leaf counts
+        """
+        return (self.feature.tobytes(), self.value.tobytes(), self.threshold.tobytes(), self.n1.tobytes())
+
+class DectreeEnsemble(object):
+    """
+    Evaluates many compiled trees against a matrix of encoded datapoints
+    in one go. Trees sharing the same split structure (which is common
+    for the shallow trees fitted on single games) are routed only once,
+    so the cost grows with the number of distinct structures rather than
+    with the number of trees. The nodes of all structures are stacked in
+    one set of arrays and routed together, one step per tree level
+    """
+
+    def __init__(self, trees, classes=ACTIONS, labels=SYMBOLS):
+        self.classes    = np.array(classes)
+        self.compiled   = (list(classes), list(labels))
+        self.shapes     = {}
+        self.structures = []
+        self.shape      = np.zeros(0, dtype=np.intp)
+        self.prediction = np.full((0, 1), -1, dtype=np.intp)
+        self.roots      = np.zeros(0, dtype=np.intp)
+        self.feature    = np.zeros(0, dtype=np.intp)
+        self.value      = np.zeros(0, dtype=np.intp)
+        self.numeric    = np.zeros(0, dtype=bool)
+        self.threshold  = np.zeros(0, dtype=float)
+        self.n1         = np.zeros(0, dtype=np.intp)
+        self.n2         = np.zeros(0, dtype=np.intp)
+        self.depth      = 0
+        self.__add(trees)
+
+    def extended(self, trees):
+        """
+        Returns a new ensemble of these trees followed by trees. Only the
+        new trees are compiled, and only new structures are stacked onto
+        copies of the arrays; this ensemble is left as it is
+        """
+        ensemble = copy.copy(self)
+        ensemble.shapes     = dict(self.shapes)
+        ensemble.structures = list(self.structures)
+        ensemble.__add(trees)
+        return ensemble
+
+    def __add(self, trees):
+        # new arrays every time, so that extended copies never share a
+        # write with the ensemble they came from
+        trees = [t if isinstance(t, CompiledDectree) else t.compile(*self.compiled) for t in trees]
+        new   = []
+        shape = np.zeros(len(trees), dtype=np.intp)
+        for i, t in enumerate(trees):
+            key = t.structure()
+            if key not in self.shapes:
+                self.shapes[key] = len(self.structures)
+                self.structures.append(t)
+                new.append(t)
+            shape[i] = self.shapes[key]
+        self.shape = np.concatenate((self.shape, shape))
+        ntrees, nnodes = self.prediction.shape
+        prediction = np.full((ntrees + len(trees), max([nnodes] + [len(t.prediction) for t in trees])), -1, dtype=np.intp)
+        prediction[:ntrees, :nnodes] = self.prediction
+        for i, t in enumerate(trees, ntrees):
+            prediction[i, :len(t.prediction)] = t.prediction
+        self.prediction = prediction
+        roots = len(self.feature) + np.cumsum([0] + [len(t.feature) for t in new])[:-1]
+        self.roots = np.concatenate((self.roots, roots.astype(np.intp)))
+        stack = lambda name, dtype: np.concatenate([getattr(self, name)] + [getattr(t, name) for t in new]).astype(dtype)
+        self.feature   = stack('feature', np.intp)
+        self.value     = stack('value', np.intp)
+        self.numeric   = stack('numeric', bool)
+        self.threshold = stack('threshold', float)
+        self.n1 = np.concatenate([self.n1] + [np.where(t.n1 >= 0, t.n1 + r, -1) for t, r in zip(new, roots)]).astype(np.intp)
+        self.n2 = np.concatenate([self.n2] + [np.where(t.n2 >= 0, t.n2 + r, -1) for t, r in zip(new, roots)]).astype(np.intp)
+        self.depth = max([self.depth] + [t.depth for t in new])
+
+    def __len__(self):
+        return len(self.prediction)
+
+    def predict_batch(self, X):
+        """
+        Returns a (trees x datapoints) array of predicted class indices,
+        -1 where a tree has no prediction
+        """
+        X = np.asarray(X)
+        X = X.reshape(len(X), int(np.prod(X.shape[1:])))
+        nrows, nfeatures = X.shape
+        if len(self) == 0:
+            return np.zeros((0, nrows), dtype=np.intp)
+        node = np.repeat(self.roots[:, np.newaxis], nrows, axis=1)
+        rows = np.broadcast_to(np.arange(nrows), node.shape)
+        for _ in range(self.depth):
+            c = self.feature[node]
+            active = (c >= 0) & (c < nfeatures)
+            if not active.any():
+                break
+            n = node[active]
+            x = X[rows[active], c[active]]
+            go = np.where(self.numeric[n], x >= self.threshold[n], x == self.value[n])
+            node[active] = np.where(x < 0, n, np.where(go, self.n1[n], self.n2[n]))
+        leaves = node - self.roots[:, np.newaxis]
+        return self.prediction[np.arange(len(self))[:, np.newaxis], leaves[self.shape]]
+
+    def hits(self, X, targets):
+        """
+        Returns per tree how many datapoints in X it predicts correctly
+        """
+        return np.sum(self.predict_batch(X) == np.asarray(targets)[np.newaxis, :], axis=1)
+
+    def vote(self, x, weights=None):
+        """
+        Returns the weighted vote of all trees for a single encoded
+        datapoint, as a weight per class
+        """
+        p = self.predict_batch(np.asarray(x)[np.newaxis, :])[:, 0]
+        w = np.ones(len(self)) if weights is None else np.asarray(weights, dtype=float)
+        return classcounts.weighted(p, w, len(self.classes))
+
 
 
 
@@ -158,29 +510,29 @@ class Dectree(object):
 
 
 def loadGameHistory():
-    print("Loading previous game data from historical_games.npz")
-    try:
-        f = np.load("historical_games.npz")
-        player_history     = f['player_history'].tolist()
-        outcome_history    = f['outcome_history'].tolist()
-        prediction_history = f['prediction_history'].tolist()
-        ai_history         = f['ai_history'].tolist()
-    except:
-        player_history     = []
-        outcome_history    = []
-        prediction_history = []
-        ai_history         = []
-    return player_history, outcome_history, prediction_history, ai_history
+    import gamelog
+    print("Loading previous game data from %s"%(gamelog.LOG_FILE))
+    log = gamelog.GameLog()
+    history = [[], [], [], []]
+    for game in log.games():
+        for h, g in zip(history, game):
+            h.append(g)
+    return history[0], history[1], history[2], history[3]
 
 def saveGameHistory(player_history, outcome_history, prediction_history, ai_history):
+    import gamelog
     if not checkGameHistoryIntegrity(player_history, outcome_history, prediction_history, ai_history, True):
         print("Game history integrity not guaranteed. Boldly refusing to save the data")
         return
     if len(player_history) == 0:
         print("Empty game history. Nothing to save")
         return
-    print("Saving game history to historical_games.npz")
-    np.savez_compressed("historical_games.npz", player_history=player_history, outcome_history=outcome_history, prediction_history=prediction_history, ai_history=ai_history)
+    log = gamelog.GameLog()
+    if len(log) > len(player_history):
+        print("Game log holds more games than the history to save. Boldly refusing to save the data")
+        return
+    print("Appending %d games to %s"%(len(player_history)-len(log), gamelog.LOG_FILE))
+    log.appendPacked([gamelog.pack(*game) for game in list(zip(player_history, outcome_history, prediction_history, ai_history))[len(log):]])
 
 def checkGameIntegrity(player_game, outcome_game, prediction_game, ai_game):
     if len(player_game) != len(outcome_game):
@@ -212,37 +564,53 @@ def checkGameHistoryIntegrity(player_history, outcome_history, prediction_histor
                 return False
     return True
 
-def buildDectree(player_game, outcome_game, prediction_game, ai_game, nturns):
-    if not checkGameIntegrity(player_game, outcome_game, prediction_game, ai_game):
-        print("Game integrity not guaranteed. Cannot build AI")
-        return None
-    if len(player_game) <= nturns - 1:
+def fitDectree(features, nturns):
+    """
+    Fits the tree of a game held as gamefeatures.GameFeatures
+    """
+    if features is None or len(features) <= nturns - 1:
         return None
-    target = player_game[nturns : ]
-    data   = []
-    for turn in range(nturns):
-        data.append(player_game[turn : len(player_game)-nturns+turn])
-    for turn in range(nturns):
-        data.append(outcome_game[turn : len(player_game)-nturns+turn])
-    #for turn in range(nturns):
-    #    data.append(prediction_game[turn : len(player_game)-nturns+turn])
-    for turn in range(nturns):
-        data.append(ai_game[turn : len(player_game)-nturns+turn])
+    data, target = features.data(nturns)
     min_samples_leaf   = len(target)//10
     min_samples_split  = 2 * min_samples_leaf
     min_impurity_split = 0.2
     max_depth          = min(6,len(data)//3)
     tree = Dectree(max_depth, min_samples_split, min_samples_leaf, min_impurity_split)
-    tree.fit(data, target)
+    tree.fit_codes(data, target, np.array(SYMBOLS), np.array(ACTIONS))
     return tree
 
-def buildDectrees(player_history, outcome_history, prediction_history, ai_history, nturns):
+def buildDectree(player_game, outcome_game, prediction_game, ai_game, nturns):
+    import gamefeatures
+    features = gamefeatures.GameFeatures.fromLabels(player_game, outcome_game, prediction_game, ai_game)
+    if features is None:
+        print("Game integrity not guaranteed. Cannot build AI")
+        return None
+    return fitDectree(features, nturns)
+
+def buildDectrees(player_history, outcome_history, prediction_history, ai_history, nturns, workers=1):
+    """
+    Builds the trees of all games. With workers other than 1 the games are
+    packed and fitted on the treepool process pool (workers=None uses one
+    process per core)
+    """
     if not checkGameHistoryIntegrity(player_history, outcome_history, prediction_history, ai_history, False):
         return []
+    if workers != 1:
+        import gamelog
+        import treepool
+        packed = []
+        for pl,ou,pr,ai in zip(player_history, outcome_history, prediction_history, ai_history):
+            if checkGameIntegrity(pl, ou, pr, ai):
+                packed.append(gamelog.pack(pl, ou, pr, ai))
+            else:
+                print("Game integrity not guaranteed. Cannot build AI")
+        return [x for x in treepool.fitPacked(packed, nturns, workers) if x is not None]
     return [x for x in [buildDectree(pl,ou,pr,ai,nturns) for pl,ou,pr,ai in zip(player_history, outcome_history, prediction_history, ai_history)] if x is not None]
 
 def buildDatapoint(pl, ou, pr, ai, nturns, i=-1):
-    if not checkGameIntegrity(pl, ou, pr, ai):
+    import gamefeatures
+    features = gamefeatures.GameFeatures.fromLabels(pl, ou, pr, ai)
+    if features is None:
         print("Game integrity not guaranteed")
         return None
     if len(pl) < nturns:
@@ -251,27 +619,19 @@ def buildDatapoint(pl, ou, pr, ai, nturns, i=-1):
         i += len(pl)
     while i >= len(pl):
         i -= len(pl)
-    i += 1
-    datapoint = []
-    datapoint += pl[i-nturns : i]
-    datapoint += ou[i-nturns : i]
-    #datapoint += pr[i-nturns : i]
-    datapoint += ai[i-nturns : i]
-    return datapoint
+    if i + 1 < nturns:
+        # fewer than nturns rounds so far: the plain slices, as always
+        return pl[i+1-nturns : i+1] + ou[i+1-nturns : i+1] + ai[i+1-nturns : i+1]
+    return np.array(SYMBOLS, dtype=object)[features.datapoint(nturns, i)].tolist()
 
 def buildDatapoints(pl, ou, pr, ai, nturns):
-    if not checkGameIntegrity(pl, ou, pr, ai):
+    import gamefeatures
+    features = gamefeatures.GameFeatures.fromLabels(pl, ou, pr, ai)
+    if features is None:
         print("Game integrity not guaranteed")
         return None
     if len(pl) < nturns:
         return None
-    targetpoints = pl[nturns:]
-    datapoints = []
-    for i in range(nturns, len(pl)):
-        datapoint  = []
-        datapoint += pl[i-nturns : i]
-        datapoint += ou[i-nturns : i]
-        #datapoint += pr[i-nturns : i]
-        datapoint += ai[i-nturns : i]
-        datapoints.append(datapoint)
-    return datapoints, targetpoints
+    datapoints, targetpoints = features.datapoints(nturns)
+    labels = np.array(SYMBOLS, dtype=object)
+    return labels[datapoints.reshape(len(datapoints), 3*nturns)].tolist(), labels[targetpoints].tolist()
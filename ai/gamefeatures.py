@@ -0,0 +1,116 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import dectree
+
+# rows of the game buffer; the first three are the features
+PLAYER, OUTCOME, AI, PREDICTION = range(4)
+
+class GameFeatures(object):
+    """
+    A game kept as one integer-encoded buffer: a (4, capacity) int8 array
+    of codes into dectree.SYMBOLS, one column per round, with rows player,
+    outcome, ai and prediction. Appending a round is amortized O(1).
+
+    The nturns-lag features are sliding windows over the first three
+    rows, so datapoints and targets are zero-copy views of the buffer,
+    laid out as dectree.buildDatapoint lays out its lists once flattened:
+    the player's last nturns actions, then the outcomes, then the AI's
+    actions. Views are only valid until the next append
+    """
+
+    def __init__(self, capacity=64):
+        self.buf = np.zeros((4, capacity), dtype=np.int8)
+        self.n   = 0
+
+    @classmethod
+    def fromLabels(cls, player_game, outcome_game, prediction_game, ai_game):
+        """
+        Encodes a game given as lists of labels. Returns None when the
+        game fails dectree.checkGameIntegrity
+        """
+        if not dectree.checkGameIntegrity(player_game, outcome_game, prediction_game, ai_game):
+            return None
+        features = cls(max(len(player_game), 1))
+        features.buf[PLAYER, :len(player_game)]     = dectree.encode(player_game)
+        features.buf[OUTCOME, :len(player_game)]    = dectree.encode(outcome_game)
+        features.buf[AI, :len(player_game)]         = dectree.encode(ai_game)
+        features.buf[PREDICTION, :len(player_game)] = dectree.encode(prediction_game)
+        features.n = len(player_game)
+        return features
+
+    @classmethod
+    def fromCodes(cls, codes):
+        """
+        Wraps a game unpacked from the game log (gamelog.unpack)
+        """
+        features = cls(max(codes.shape[1], 1))
+        features.buf[PLAYER, :codes.shape[1]]     = codes[0]
+        features.buf[OUTCOME, :codes.shape[1]]    = codes[1] + len(dectree.ACTIONS)
+        features.buf[AI, :codes.shape[1]]         = codes[3]
+        features.buf[PREDICTION, :codes.shape[1]] = codes[2]
+        features.n = codes.shape[1]
+        return features
+
+    def __len__(self):
+        return self.n
+
+    def append(self, player, outcome, prediction, ai):
+        """
+        Appends a round given as codes into dectree.SYMBOLS
+        """
+        if self.n == self.buf.shape[1]:
+            self.buf = np.concatenate((self.buf, np.zeros_like(self.buf)), axis=1)
+        self.buf[:, self.n] = (player, outcome, ai, prediction)
+        self.n += 1
+
+    def appendLabels(self, player, outcome, prediction, ai):
+        self.append(*[dectree.SYMBOLS.index(x) for x in (player, outcome, prediction, ai)])
+
+    def windows(self, nturns):
+        """
+        Returns a (rounds-nturns+1, 3, nturns) view: window i holds the
+        features of rounds i to i+nturns-1
+        """
+        if self.n < nturns:
+            return np.zeros((0, 3, nturns), dtype=self.buf.dtype)
+        return sliding_window_view(self.buf[:AI+1, :self.n], nturns, axis=1).transpose(1, 0, 2)
+
+    def datapoints(self, nturns):
+        """
+        Returns the training datapoints as a (rounds-nturns, 3, nturns)
+        view and the targets (the player's next action) as a view
+        """
+        return self.windows(nturns)[:-1], self.buf[PLAYER, nturns:max(self.n, nturns)]
+
+    def datapoint(self, nturns, i=-1):
+        """
+        Returns the features of the nturns rounds up to and including
+        round i as a flat array, -1 for rounds before the game started
+        """
+        if i < 0:
+            i += self.n
+        if i + 1 >= nturns:
+            return self.buf[:AI+1, i+1-nturns:i+1].reshape(-1)
+        point = np.full((3, nturns), -1, dtype=self.buf.dtype)
+        point[:, nturns-i-1:] = self.buf[:AI+1, :i+1]
+        return point.reshape(-1)
+
+    def row(self, nturns, j):
+        """
+        Returns training datapoint j as a flat array and its target
+        """
+        return self.buf[:AI+1, j:j+nturns].reshape(-1), self.buf[PLAYER, j+nturns]
+
+    def data(self, nturns):
+        """
+        Returns the training data as the (features, samples) matrix
+        Dectree.fit_codes expects, and the targets
+        """
+        X, y = self.datapoints(nturns)
+        return X.reshape(len(X), 3*nturns).T, y
+
+    def labels(self):
+        """
+        Returns the game as lists of labels: player, outcome, prediction, ai
+        """
+        return [[dectree.SYMBOLS[c] for c in self.buf[row, :self.n].tolist()] for row in (PLAYER, OUTCOME, PREDICTION, AI)]
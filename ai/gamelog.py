@@ -0,0 +1,166 @@
+import os
+import numpy as np
+import dectree
+
+LOG_FILE     = "historical_games.rps"
+INDEX_FILE   = "historical_games.idx"
+HEAD_FILE    = "historical_games.head"
+LEGACY_FILE  = "historical_games.npz"
+
+def pack(player_game, outcome_game, prediction_game, ai_game):
+    """
+    Packs a game into one byte per round: 2 bits each for the player's
+    action, the outcome, the predicted action and the AI's action
+    """
+    pl = dectree.encode(player_game, dectree.ACTIONS)
+    ou = dectree.encode(outcome_game, dectree.OUTCOMES)
+    pr = dectree.encode(prediction_game, dectree.ACTIONS)
+    ai = dectree.encode(ai_game, dectree.ACTIONS)
+    return ((pl << 6) | (ou << 4) | (pr << 2) | ai).astype(np.uint8)
+
+def unpack(packed):
+    """
+    Splits packed rounds into a (4, rounds) array of codes: player,
+    outcome and predicted action, AI action
+    """
+    packed = np.asarray(packed, dtype=np.uint8)
+    return np.array([(packed >> shift) & 3 for shift in (6, 4, 2, 0)], dtype=np.uint8)
+
+def decode(codes):
+    """
+    Turns unpacked codes back into the lists of labels dectree works on
+    """
+    labels = (dectree.ACTIONS, dectree.OUTCOMES, dectree.ACTIONS, dectree.ACTIONS)
+    return [[l[c] for c in stream] for l, stream in zip(labels, codes.tolist())]
+
+class GameLog(object):
+    """
+    Append-only store of finished games. The rounds of all games are
+    packed back to back in the log file, one byte per round; the index
+    file holds the end offset of every game as a uint64. Both files are
+    only ever appended to, so saving a game costs O(game length), and
+    games are read lazily through a memory map.
+
+    A batch of games is committed by atomically replacing the small head
+    file (number of games, log size) through a write to a temporary file
+    and a rename, after the log and the index have been fsynced. Readers
+    only trust what the head says, so a crash at any point leaves either
+    the whole batch or none of it; the leftovers are overwritten by the
+    next append
+    """
+
+    def __init__(self, log_file=LOG_FILE, index_file=INDEX_FILE, head_file=HEAD_FILE, legacy_file=LEGACY_FILE):
+        self.log_file   = log_file
+        self.index_file = index_file
+        self.head_file  = head_file
+        if not os.path.exists(self.index_file) and legacy_file is not None and os.path.exists(legacy_file):
+            self.migrate(legacy_file)
+        self.reload()
+
+    def reload(self):
+        try:
+            with open(self.index_file, "rb") as f:
+                raw = f.read()
+        except (IOError, OSError):
+            raw = b""
+        ends = np.frombuffer(raw[:len(raw)//8*8], dtype=np.uint64)
+        size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        try:
+            head = np.fromfile(self.head_file, dtype=np.uint64)
+            ends = ends[:int(head[0])]
+        except (IOError, OSError, IndexError):
+            pass
+        self.ends  = ends[ends <= size]
+        self.__map = None
+
+    def signature(self):
+        """
+        Changes whenever games are committed, also by another process
+        """
+        try:
+            st = os.stat(self.head_file)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __data(self):
+        end = int(self.ends[-1]) if len(self.ends) > 0 else 0
+        if self.__map is None or len(self.__map) < end:
+            self.__map = np.memmap(self.log_file, dtype=np.uint8, mode="r") if end > 0 else np.zeros(0, dtype=np.uint8)
+        return self.__map
+
+    def packed(self, i):
+        """
+        Returns the packed rounds of game i as a read-only view
+        """
+        start = int(self.ends[i-1]) if i > 0 else 0
+        return self.__data()[start:int(self.ends[i])]
+
+    def codes(self, i):
+        return unpack(self.packed(i))
+
+    def game(self, i):
+        """
+        Returns game i as lists of labels: player, outcome, prediction, ai
+        """
+        return decode(self.codes(i))
+
+    def games(self):
+        for i in range(len(self)):
+            yield self.game(i)
+
+    def append(self, player_game, outcome_game, prediction_game, ai_game):
+        """
+        Appends one finished game. Only the game itself is written
+        """
+        self.appendPacked([pack(player_game, outcome_game, prediction_game, ai_game)])
+
+    def appendPacked(self, packed_games):
+        """
+        Appends packed games and commits them in one go
+        """
+        end = int(self.ends[-1]) if len(self.ends) > 0 else 0
+        ends = []
+        with open(self.log_file, "ab") as f:
+            f.truncate(end)
+            for packed in packed_games:
+                f.write(np.asarray(packed, dtype=np.uint8).tobytes())
+                end += len(packed)
+                ends.append(end)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.index_file, "ab") as f:
+            f.truncate(8 * len(self.ends))
+            f.write(np.array(ends, dtype=np.uint64).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        ends = np.concatenate((self.ends, np.array(ends, dtype=np.uint64)))
+        tmp = self.head_file + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(np.array([len(ends), end], dtype=np.uint64).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.head_file)
+        self.ends = ends
+
+    def migrate(self, legacy_file):
+        """
+        Imports the games of an old historical_games.npz
+        """
+        print("Converting %s to %s"%(legacy_file, self.log_file))
+        try:
+            f = np.load(legacy_file, allow_pickle=True)
+            history = [f[k].tolist() for k in ('player_history', 'outcome_history', 'prediction_history', 'ai_history')]
+        except Exception as e:
+            print("Could not read %s: %s"%(legacy_file, str(e)))
+            return
+        if not dectree.checkGameHistoryIntegrity(*history):
+            print("Game history integrity not guaranteed. Not converting %s"%(legacy_file))
+            return
+        self.ends = np.zeros(0, dtype=np.uint64)
+        if os.path.exists(self.log_file):
+            os.remove(self.log_file)
+        self.appendPacked([pack(*game) for game in zip(*history)])
@@ -0,0 +1,90 @@
+import queue
+import threading
+import time
+
+# seconds close waits for the queued games to be written
+CLOSE_TIMEOUT = 10.0
+
+class HistoryWriter(object):
+    """
+    Saves finished games on a background thread, so that a request never
+    waits for the disk. Games are queued in a bounded queue and written
+    in batches of up to batch_size through write(packed_games), which is
+    expected to commit a batch atomically (GameLog.appendPacked does).
+    A failing batch is kept and retried every retry_delay seconds, and
+    the thread keeps running
+    """
+
+    def __init__(self, write, maxsize=256, batch_size=32, retry_delay=1.0):
+        self.write       = write
+        self.batch_size  = batch_size
+        self.retry_delay = retry_delay
+        self.queue       = queue.Queue(maxsize)
+        self.batch       = []
+        self.closed      = False
+        self.thread      = threading.Thread(target=self.run, name="HistoryWriter")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, packed):
+        """
+        Queues a packed game. Returns False, dropping the game, when the
+        queue is full or the writer has been closed
+        """
+        if packed is None or self.closed:
+            return False
+        try:
+            self.queue.put_nowait(packed)
+        except queue.Full:
+            print("History writer queue full. Dropping a game")
+            return False
+        return True
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """
+        Writes out everything still queued and stops the thread, giving up
+        after timeout seconds (None waits forever). Returns whether all
+        games were saved
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        if not self.closed:
+            self.closed = True
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+        self.thread.join(None if deadline is None else max(deadline - time.time(), 0))
+        if self.thread.is_alive():
+            print("History writer did not finish in %ss. Dropping %d unsaved games"%(
+                timeout, len(self.batch) + self.queue.qsize()))
+            return False
+        return True
+
+    def run(self):
+        batch   = self.batch
+        closing = False
+        while not closing or batch:
+            if not closing:
+                try:
+                    # a failed batch is retried after retry_delay, games or not
+                    item = self.queue.get(timeout=self.retry_delay if batch else None)
+                    while item is not None:
+                        batch.append(item)
+                        if len(batch) >= self.batch_size:
+                            break
+                        try:
+                            item = self.queue.get_nowait()
+                        except queue.Empty:
+                            break
+                    closing = item is None
+                except queue.Empty:
+                    pass
+            if not batch:
+                continue
+            try:
+                self.write(batch)
+                del batch[:]
+            except Exception as e:
+                print("Could not save %d games: %s. Retrying"%(len(batch), str(e)))
+                if closing:
+                    time.sleep(self.retry_delay)
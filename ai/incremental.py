@@ -0,0 +1,161 @@
+import numpy as np
+import dectree
+import classcounts
+import gamefeatures
+
+class _Node(object):
+
+    def __init__(self, nclasses):
+        self.samples   = []
+        self.counts    = np.zeros(nclasses, dtype=np.intp)
+        self.evaluated = 0
+        self.column    = None
+        self.value     = None
+        self.n1        = None
+        self.n2        = None
+
+class IncrementalDectree(object):
+    """
+    A decision tree over the current game that learns one move at a time.
+    Every move appends a single training row (the nturns previous rounds
+    as features, the player's action as target) and updates the class
+    counts on the path that row takes. Splits are only re-evaluated on
+    that path, and only once a node has grown by refit_ratio since it was
+    last evaluated, so the cost per move stays flat over long games.
+
+    The rows are read from a gamefeatures.GameFeatures, which can be
+    shared with other learners on the same game; call update after
+    appending rounds to it. The hyperparameters follow
+    dectree.buildDectree, evaluated for the number of rows seen when a
+    node is (re)fitted
+    """
+
+    def __init__(self, nturns, features=None, refit_ratio=0.25, min_impurity_split=0.2):
+        self.nturns             = nturns
+        self.features           = gamefeatures.GameFeatures() if features is None else features
+        self.refit_ratio        = refit_ratio
+        self.min_impurity_split = min_impurity_split
+        self.max_depth          = min(6, nturns)
+        self.nlabels            = len(dectree.SYMBOLS)
+        self.nclasses           = len(dectree.ACTIONS)
+        self.nrows  = 0
+        self.root   = _Node(self.nclasses)
+
+    def add(self, player, outcome, prediction, ai):
+        """
+        Records a played round, given as labels
+        """
+        self.features.appendLabels(player, outcome, prediction, ai)
+        self.update()
+
+    def update(self):
+        """
+        Learns the rows of all rounds appended to the features since the
+        last update
+        """
+        for j in range(self.nrows, len(self.features) - self.nturns):
+            self.nrows = j + 1
+            self.__insert(j, *self.features.row(self.nturns, j))
+
+    def datapoint(self):
+        """
+        Returns the encoded datapoint of the last nturns rounds, laid out
+        as dectree.buildDatapoint does. Missing rounds are coded -1
+        """
+        return self.features.datapoint(self.nturns)
+
+    def rows(self):
+        """
+        Returns the training rows learned so far as a (rows, 3, nturns)
+        view and the matching targets
+        """
+        X, y = self.features.datapoints(self.nturns)
+        return X[:self.nrows], y[:self.nrows]
+
+    def counts(self, x):
+        """
+        Returns the class counts of the training rows in the leaf x falls
+        in, stopping early at a split on a missing (negative) feature
+        """
+        node = self.root
+        while node.column is not None:
+            if node.column >= len(x) or x[node.column] < 0:
+                break
+            node = node.n1 if x[node.column] == node.value else node.n2
+        return node.counts
+
+    def predict(self, x):
+        counts = self.counts(x)
+        if counts.sum() == 0:
+            return None
+        return dectree.ACTIONS[classcounts.argmax(counts)]
+
+    def __samples(self, node):
+        """
+        Returns the rows of node as (features, samples) and the targets
+        """
+        X, y = self.features.datapoints(self.nturns)
+        idx  = np.array(node.samples, dtype=np.intp)
+        return X[idx].reshape(len(idx), 3*self.nturns).T, y[idx]
+
+    def __insert(self, j, x, y):
+        node  = self.root
+        depth = 0
+        while node is not None:
+            node.samples.append(j)
+            node.counts[y] += 1
+            if len(node.samples) >= max(1, node.evaluated * (1.0 + self.refit_ratio)):
+                if self.__refit(node, depth):
+                    return
+            if node.column is None:
+                return
+            node   = node.n1 if x[node.column] == node.value else node.n2
+            depth += 1
+
+    def __split(self, node, depth):
+        """
+        Returns the best (column, value) for node under the current
+        hyperparameters, or (None, None) when it should be a leaf
+        """
+        min_samples_leaf  = self.nrows // 10
+        min_samples_split = 2 * min_samples_leaf
+        if depth >= self.max_depth or len(node.samples) < min_samples_split:
+            return None, None
+        if dectree.gini_counts(node.counts) < self.min_impurity_split:
+            return None, None
+        data, target = self.__samples(node)
+        s, c, v = dectree.split_level_codes(data, target, self.nlabels, self.nclasses, min_samples_leaf)
+        if s is None:
+            return None, None
+        return int(c), int(v)
+
+    def __refit(self, node, depth):
+        """
+        Re-evaluates the split of node. Returns True when the subtree had
+        to be rebuilt (which already accounts for the latest row)
+        """
+        node.evaluated = len(node.samples)
+        c, v = self.__split(node, depth)
+        if c == node.column and v == node.value:
+            return False
+        self.__grow(node, c, v, depth)
+        return True
+
+    def __grow(self, node, c, v, depth):
+        node.column = c
+        node.value  = v
+        node.n1     = None
+        node.n2     = None
+        if c is None:
+            return
+        node.n1 = _Node(self.nclasses)
+        node.n2 = _Node(self.nclasses)
+        data, target = self.__samples(node)
+        mask = data[c] == v
+        samples = np.array(node.samples, dtype=np.intp)
+        for child, m in ((node.n1, mask), (node.n2, ~mask)):
+            child.samples = samples[m].tolist()
+            child.counts  = classcounts.bincount(target[m], self.nclasses)
+        for child in (node.n1, node.n2):
+            child.evaluated = len(child.samples)
+            self.__grow(child, *self.__split(child, depth+1), depth=depth+1)
@@ -0,0 +1,68 @@
+ACTIONS  = ['rock', 'paper', 'scissors']
+# (player - ai) % 3 with actions as indices into ACTIONS
+OUTCOMES = ['draw', 'win', 'loss']
+
+class PatternIndex(object):
+    """
+    Predicts the player's next action from what they did the last time
+    the same outcomes came up. A follow-up is the player's action relative
+    to the AI's previous action, expressed as an outcome (did they play
+    what beats it, what it beats, or the same).
+
+    For every context length k up to context, a table maps the outcomes of
+    k consecutive rounds to the follow-up seen most recently after them.
+    The tables are updated as rounds are appended, so a prediction costs
+    O(context) however long the game is. The longest context seen before
+    wins; with context=1 this is the history matching rule of
+    ai_server_0. Actions and outcomes are indices into ACTIONS and
+    OUTCOMES
+    """
+
+    def __init__(self, context=1):
+        self.context  = context
+        self.follow   = [[-1] * 3**k for k in range(1, context+1)]
+        self.outcomes = bytearray()
+        self.last_ai  = None
+        self.last_followup = None
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def __key(self, end, k):
+        key = 0
+        for o in self.outcomes[end-k:end]:
+            key = 3 * key + o
+        return key
+
+    def append(self, player, ai):
+        n = len(self.outcomes)
+        if n > 0:
+            followup = (player - self.last_ai) % 3
+            for k in range(1, min(self.context, n) + 1):
+                self.follow[k-1][self.__key(n, k)] = followup
+            self.last_followup = followup
+        self.outcomes.append((player - ai) % 3)
+        self.last_ai = ai
+
+    def followup(self):
+        """
+        Returns the expected follow-up to the last round, or None before
+        the second round
+        """
+        n = len(self.outcomes)
+        if n < 2:
+            return None
+        for k in range(min(self.context, n), 0, -1):
+            followup = self.follow[k-1][self.__key(n, k)]
+            if followup >= 0:
+                return followup
+        return self.last_followup
+
+    def predict(self):
+        """
+        Returns the expected next action of the player, or None
+        """
+        followup = self.followup()
+        if followup is None:
+            return None
+        return (self.last_ai + followup) % 3
@@ -0,0 +1,130 @@
+import threading
+import dectree
+
+# a round is one symbol, 3 * player action + ai action (codes into
+# dectree.ACTIONS); the outcome follows from the two
+NSYMBOLS = len(dectree.ACTIONS)**2
+
+def symbol(player, ai):
+    return len(dectree.ACTIONS) * player + ai
+
+class ContextCounts(object):
+    """
+    Counts of the player's next action after every context of up to
+    max_order rounds. Contexts are kept as one hash table per order, keyed
+    by the rounds packed into an int, so adding a move touches
+    max_order + 1 entries whatever the amount of data
+    """
+
+    def __init__(self, max_order=4):
+        self.max_order = max_order
+        self.tables    = [{} for _ in range(max_order+1)]
+
+    def keys(self, symbols):
+        """
+        Returns the key of every order for the context ending with the
+        last of symbols. Orders the context is too short for are left out
+        """
+        keys = [0]
+        key  = 0
+        for m, s in enumerate(reversed(symbols[-self.max_order:] if self.max_order > 0 else [])):
+            key += (s + 1) * NSYMBOLS**m
+            keys.append(key)
+        return keys
+
+    def add(self, keys, action, weight=1):
+        for table, key in zip(self.tables, keys):
+            counts = table.get(key)
+            if counts is None:
+                counts = table[key] = [0, 0, 0]
+            counts[action] += weight
+
+    def counts(self, order, key):
+        return self.tables[order].get(key)
+
+    def addGame(self, players, ais):
+        """
+        Adds every move of a game given as action codes
+        """
+        symbols = []
+        for player, ai in zip(players, ais):
+            self.add(self.keys(symbols), player)
+            symbols.append(symbol(player, ai))
+
+class HistoryContexts(object):
+    """
+    ContextCounts over all games in a gamelog.GameLog. Games committed to
+    the log are picked up by sync, which only reads the new ones
+    """
+
+    def __init__(self, log, max_order=4, lock=None):
+        self.log       = log
+        self.max_order = max_order
+        self.lock      = threading.RLock() if lock is None else lock
+        self.contexts  = ContextCounts(max_order)
+        self.ngames    = 0
+
+    def sync(self):
+        with self.lock:
+            if len(self.log) < self.ngames:
+                print("Game history shrank. Recounting contexts")
+                self.contexts = ContextCounts(self.max_order)
+                self.ngames   = 0
+            for i in range(self.ngames, len(self.log)):
+                codes = self.log.codes(i)
+                self.contexts.addGame(codes[0].tolist(), codes[3].tolist())
+            self.ngames = len(self.log)
+            return self.contexts
+
+class ContextPredictor(object):
+    """
+    Variable-order context model (PPM) of one player's game. The counts
+    of the current game are weighted by game_weight and added to the
+    counts over the history; the orders are then blended from the
+    shortest context up, each order escaping to the blend of the shorter
+    ones with probability distinct / (total + distinct) (PPM method C).
+    Learning a move and predicting both cost O(max_order)
+    """
+
+    def __init__(self, history=None, max_order=4, game_weight=4.0):
+        self.history     = history
+        self.max_order   = max_order
+        self.game_weight = game_weight
+        self.game        = ContextCounts(max_order)
+        self.symbols     = []
+        self.context     = [0]
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def add(self, player, ai):
+        """
+        Learns a move given as action codes
+        """
+        self.game.add(self.context, player)
+        self.symbols.append(symbol(player, ai))
+        self.context = self.game.keys(self.symbols)
+
+    def probabilities(self):
+        """
+        Returns the blended probabilities of the player's next action
+        """
+        history = self.history.sync() if self.history is not None else None
+        p = [1.0/3] * 3
+        for order, key in enumerate(self.context):
+            counts = [0.0, 0.0, 0.0]
+            for table, weight in ((self.game, self.game_weight), (history, 1.0)):
+                c = table.counts(order, key) if table is not None else None
+                if c is not None:
+                    counts = [a + weight * b for a, b in zip(counts, c)]
+            total = sum(counts)
+            if total == 0:
+                continue
+            distinct = sum(1 for c in counts if c > 0)
+            escape   = distinct / (total + distinct)
+            p = [(1 - escape) * c / total + escape * q for c, q in zip(counts, p)]
+        return p
+
+    def predict(self):
+        p = self.probabilities()
+        return dectree.ACTIONS[p.index(max(p))]
@@ -0,0 +1,8 @@
+def outcome(pl1, pl2):
+    return "draw" if pl1==pl2 else "win" if (pl1=="rock" and pl2=="scissors") or (pl1=="paper" and pl2=="rock") or (pl1=="scissors" and pl2=="paper") else "loss"
+
+def win_from(action):
+    return "rock" if action=="scissors" else "paper" if action=="rock" else "scissors"
+
+def win_with(result, action):
+    return "rock" if (result=="win" and action=="scissors") or (result=="draw" and action=="rock") or (result=="loss" and action=="paper") else "paper" if (result=="win" and action=="rock") or (result=="draw" and action=="paper") or (result=="loss" and action=="scissors") else "scissors"
@@ -0,0 +1,80 @@
+import threading
+import time
+
+DEFAULT_SESSION = "default"
+
+def sessionId(request):
+    """
+    Returns the session id of a request, from the session query parameter
+    or the X-Session-Id header. Clients that send neither share the
+    default session, which keeps the single-player front-end working
+    """
+    return request.args.get("session") or request.headers.get("X-Session-Id") or DEFAULT_SESSION
+
+class SessionStore(object):
+    """
+    Thread-safe store of per-session game state. States are created on
+    first use by factory() and evicted after idle_timeout seconds without
+    a request, or oldest first once there are more than max_sessions.
+    on_evict(session_id, state) is called for every evicted state
+    """
+
+    def __init__(self, factory, idle_timeout=1800.0, max_sessions=1000, on_evict=None):
+        self.factory      = factory
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.on_evict     = on_evict
+        self.lock         = threading.Lock()
+        self.sessions     = {}
+        self.last_sweep   = time.time()
+
+    def get(self, session_id):
+        """
+        Returns the state of session_id, creating it if needed
+        """
+        now = time.time()
+        with self.lock:
+            evicted = self.__sweep(now)
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                entry = [self.factory(), now]
+                self.sessions[session_id] = entry
+                evicted += self.__trim()
+            entry[1] = now
+        self.__evicted(evicted)
+        return entry[0]
+
+    def reset(self, session_id, *args):
+        """
+        Replaces the state of session_id by a fresh one, factory(*args),
+        and returns the previous state, or None if there was none
+        """
+        now = time.time()
+        with self.lock:
+            old = self.sessions.get(session_id)
+            self.sessions[session_id] = [self.factory(*args), now]
+            evicted = self.__sweep(now) + self.__trim()
+        self.__evicted(evicted)
+        return None if old is None else old[0]
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __sweep(self, now):
+        if now - self.last_sweep < self.idle_timeout / 10.0:
+            return []
+        self.last_sweep = now
+        idle = [k for k, (_, t) in self.sessions.items() if now - t > self.idle_timeout]
+        return [(k, self.sessions.pop(k)[0]) for k in idle]
+
+    def __trim(self):
+        if len(self.sessions) <= self.max_sessions:
+            return []
+        oldest = sorted(self.sessions, key=lambda k: self.sessions[k][1])
+        return [(k, self.sessions.pop(k)[0]) for k in oldest[:len(self.sessions)-self.max_sessions]]
+
+    def __evicted(self, evicted):
+        for session_id, state in evicted:
+            print("Evicting idle session %s"%(session_id))
+            if self.on_evict is not None:
+                self.on_evict(session_id, state)
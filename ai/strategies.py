@@ -0,0 +1,306 @@
+import threading
+import time
+import numpy as np
+import dectree
+import classcounts
+import gamefeatures
+import incremental
+import patternindex
+import ppm
+
+# name -> strategy class, in registration order
+REGISTRY = {}
+# what ai_server.py runs by default
+DEFAULT  = ["dectree", "ppm", "pattern", "frequency"]
+
+def register(name):
+    """
+    Class decorator adding a Strategy to the registry under name
+    """
+    def decorate(cls):
+        cls.name = name
+        REGISTRY[name] = cls
+        return cls
+    return decorate
+
+class Shared(object):
+    """
+    The resources strategies share between sessions: the tree cache of
+    the historical games and the context counts over the same log
+    """
+
+    def __init__(self, history):
+        self.history  = history
+        self.contexts = ppm.HistoryContexts(history.log, lock=history.lock)
+
+class RingBuffer(object):
+    """
+    The last size values of a stream with their running sum
+    """
+
+    def __init__(self, size):
+        self.values = np.zeros(size)
+        self.n      = 0
+        self.total  = 0.0
+
+    def __len__(self):
+        return min(self.n, len(self.values))
+
+    def append(self, x):
+        i = self.n % len(self.values)
+        self.total += x - self.values[i]
+        self.values[i] = x
+        self.n += 1
+
+    def sum(self):
+        return self.total
+
+    def mean(self):
+        return self.total / len(self) if len(self) > 0 else 0.0
+
+class Strategy(object):
+    """
+    A predictor of the player's next action in one game. It reads the
+    rounds from the game's gamefeatures.GameFeatures: update is called
+    once a round has been appended, predict then returns votes for the
+    next action, aligned with dectree.ACTIONS, or None without an opinion
+    """
+
+    name = None
+
+    def __init__(self, features, shared):
+        self.features = features
+        self.shared   = shared
+
+    def update(self):
+        pass
+
+    def predict(self):
+        return None
+
+@register("dectree")
+class DectreeStrategy(Strategy):
+    """
+    Decision trees on this game's last one or two rounds, together with
+    the trees of the historical games weighted by how well they predict
+    this game so far
+    """
+
+    def __init__(self, features, shared):
+        Strategy.__init__(self, features, shared)
+        self.learners = dict((nturns, incremental.IncrementalDectree(nturns, features)) for nturns in (1, 2))
+        self.hits     = {}
+
+    def update(self):
+        for learner in self.learners.values():
+            learner.update()
+
+    def ensembleHits(self, nturns, trees):
+        """
+        Returns per historical tree how many moves of this game it
+        predicted correctly, only scoring the rows added since the last call
+        """
+        X, y = self.features.datapoints(nturns)
+        scored, seen, h = self.hits.get(nturns, (None, 0, None))
+        if scored is not trees:
+            seen, h = 0, np.zeros(len(trees))
+        h = h + trees.hits(X[seen:], y[seen:])
+        self.hits[nturns] = (trees, len(y), h)
+        return h
+
+    def predict(self):
+        history = self.shared.history
+        if len(self.features) <= 1:
+            trees = history.ensemble(1)
+            if len(trees) == 0:
+                return None
+            return trees.vote(self.learners[1].datapoint())
+        nturns = 1 if len(self.features) <= 5 else 2
+        point  = self.learners[nturns].datapoint()
+        votes  = self.learners[nturns].counts(point).astype(float)
+        trees  = history.ensemble(nturns)
+        if len(trees) > 0:
+            votes += trees.vote(point, self.ensembleHits(nturns, trees) / votes.sum())
+        return votes
+
+@register("ppm")
+class PPMStrategy(Strategy):
+    """
+    ppm.ContextPredictor over this game and the historical games
+    """
+
+    def __init__(self, features, shared):
+        Strategy.__init__(self, features, shared)
+        self.model = ppm.ContextPredictor(shared.contexts)
+
+    def update(self):
+        last = self.features.buf[:, len(self.features)-1]
+        self.model.add(int(last[gamefeatures.PLAYER]), int(last[gamefeatures.AI]))
+
+    def predict(self):
+        return self.model.probabilities()
+
+@register("pattern")
+class PatternStrategy(Strategy):
+    """
+    The history matching rule of ai_server_0 (patternindex.PatternIndex)
+    """
+
+    context = 1
+    # dectree.ACTIONS code -> patternindex.ACTIONS code, and back
+    TO_INDEX   = [patternindex.ACTIONS.index(a) for a in dectree.ACTIONS]
+    FROM_INDEX = [dectree.ACTIONS.index(a) for a in patternindex.ACTIONS]
+
+    def __init__(self, features, shared):
+        Strategy.__init__(self, features, shared)
+        self.index = patternindex.PatternIndex(self.context)
+
+    def update(self):
+        last = self.features.buf[:, len(self.features)-1]
+        self.index.append(self.TO_INDEX[last[gamefeatures.PLAYER]], self.TO_INDEX[last[gamefeatures.AI]])
+
+    def predict(self):
+        action = self.index.predict()
+        if action is None:
+            return None
+        votes = np.zeros(len(dectree.ACTIONS))
+        votes[self.FROM_INDEX[action]] = 1
+        return votes
+
+@register("pattern3")
+class LongPatternStrategy(PatternStrategy):
+    """
+    The history matching rule on the outcomes of the last three rounds
+    """
+
+    context = 3
+
+@register("frequency")
+class FrequencyStrategy(Strategy):
+    """
+    Counts how often the player played each action in this game
+    """
+
+    def __init__(self, features, shared):
+        Strategy.__init__(self, features, shared)
+        self.counts = np.zeros(len(dectree.ACTIONS))
+
+    def update(self):
+        self.counts[self.features.buf[gamefeatures.PLAYER, len(self.features)-1]] += 1
+
+    def predict(self):
+        return self.counts.copy()
+
+class Stats(object):
+    """
+    Hit and cost totals per strategy over all sessions
+    """
+
+    def __init__(self):
+        self.lock   = threading.Lock()
+        self.totals = {}
+
+    def add(self, name, cost, hit):
+        with self.lock:
+            t = self.totals.setdefault(name, {"moves": 0, "seconds": 0.0, "scored": 0, "hits": 0, "dropped": 0})
+            t["moves"]   += 1
+            t["seconds"] += cost
+            if hit is not None:
+                t["scored"] += 1
+                t["hits"]   += int(hit)
+
+    def dropped(self, name):
+        with self.lock:
+            self.totals.setdefault(name, {"moves": 0, "seconds": 0.0, "scored": 0, "hits": 0, "dropped": 0})["dropped"] += 1
+
+    def report(self):
+        with self.lock:
+            return dict((name, dict(t, hit_rate=t["hits"] / t["scored"] if t["scored"] else None,
+                                    mean_ms=1000.0 * t["seconds"] / t["moves"] if t["moves"] else None))
+                        for name, t in self.totals.items())
+
+STATS = Stats()
+
+class Selector(object):
+    """
+    Runs several strategies side by side on one game and picks their
+    prediction online. Each strategy's hits over its last window scored
+    moves and its time per move are kept in ring buffers. mode "best"
+    follows the strategy with the best recent hit rate (smoothed towards
+    chance, ties go to the first in names); "weighted" adds up the
+    normalized votes weighted by the squared hit rates.
+
+    Once its buffers are full, a strategy that takes more than slow
+    seconds per move without a better hit rate than the best of the
+    others is dropped from the game
+    """
+
+    def __init__(self, names, features, shared, window=20, mode="best", slow=0.001):
+        self.names      = [name for name in names if name in REGISTRY]
+        self.strategies = [REGISTRY[name](features, shared) for name in self.names]
+        self.hits       = [RingBuffer(window) for _ in self.names]
+        self.costs      = [RingBuffer(window) for _ in self.names]
+        self.guesses    = [None for _ in self.names]
+        self.votes      = [None for _ in self.names]
+        self.active     = [True for _ in self.names]
+        self.window     = window
+        self.mode       = mode
+        self.slow       = slow
+
+    def rates(self):
+        return [(h.sum() + 1.0) / (len(h) + 3.0) for h in self.hits]
+
+    def step(self, player):
+        """
+        Scores the strategies on the player's latest action (a code into
+        dectree.ACTIONS), lets them learn the round just appended to the
+        features and returns the predicted next action, or None
+        """
+        for i, strategy in enumerate(self.strategies):
+            if not self.active[i]:
+                continue
+            hit = None if self.guesses[i] is None else self.guesses[i] == player
+            if hit is not None:
+                self.hits[i].append(hit)
+            t = time.perf_counter()
+            strategy.update()
+            votes = strategy.predict()
+            cost  = time.perf_counter() - t
+            self.costs[i].append(cost)
+            STATS.add(self.names[i], cost, hit)
+            self.votes[i]   = None if votes is None else np.asarray(votes, dtype=float)
+            self.guesses[i] = None if votes is None or self.votes[i].sum() <= 0 else classcounts.argmax(self.votes[i])
+        self.__drop()
+        return self.__choose()
+
+    def __drop(self):
+        rates = self.rates()
+        for i in range(len(self.strategies)):
+            if not self.active[i] or len(self.hits[i]) < self.window or self.costs[i].mean() <= self.slow:
+                continue
+            others = [rates[j] for j in range(len(self.strategies)) if j != i and self.active[j]]
+            if others and rates[i] <= max(others):
+                print("Dropping strategy %s: %.2fms per move, hit rate %.2f"%(self.names[i], 1000*self.costs[i].mean(), rates[i]))
+                self.active[i]  = False
+                self.guesses[i] = None
+                self.votes[i]   = None
+                STATS.dropped(self.names[i])
+
+    def __choose(self):
+        rates = self.rates()
+        candidates = [i for i in range(len(self.strategies)) if self.guesses[i] is not None]
+        if not candidates:
+            return None
+        if self.mode == "weighted":
+            total = sum(rates[i]**2 * self.votes[i] / self.votes[i].sum() for i in candidates)
+            return dectree.ACTIONS[classcounts.argmax(total)]
+        best = max(candidates, key=lambda i: (rates[i], -i))
+        return dectree.ACTIONS[self.guesses[best]]
+
+    def report(self):
+        """
+        Returns the recent hit rate, time per move and state of every
+        strategy in this game
+        """
+        return dict((name, {"hit_rate": h.mean() if len(h) else None, "mean_ms": 1000.0 * c.mean(), "active": a})
+                    for name, h, c, a in zip(self.names, self.hits, self.costs, self.active))
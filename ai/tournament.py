@@ -0,0 +1,267 @@
+"""
+Headless tournament of the AI strategies against synthetic and recorded
+players.
+
+    python tournament.py -strategies ppm pattern selector -opponents wsls replay -games 400
+
+Every strategy in strategies.REGISTRY (and "selector", the server's
+default mix) plays the opponents: the bots of bots.py, re-implemented on
+action codes, and "replay", which replays the player moves of held-out
+games from the game log. The strategies learn from the other games of
+the log, exactly as in ai_server.py.
+
+Games run in lockstep, many at a time: the opponents, the rules and the
+scoring are NumPy operations over all games of a batch, and only the
+strategies step game by game. Batches are spread over a process pool.
+Reports the AI's win/draw/loss rates, how often it predicted the player,
+and the time the strategies take per move
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+AI_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, AI_DIR)
+
+import dectree
+import gamefeatures
+import gamelog
+import strategies
+import treecache
+from rules import outcome, win_from
+
+# the rules on codes into dectree.ACTIONS and dectree.OUTCOMES
+OUTCOME  = np.array([[dectree.OUTCOMES.index(outcome(p, a)) for a in dectree.ACTIONS] for p in dectree.ACTIONS], dtype=np.intp)
+WIN_FROM = np.array([dectree.ACTIONS.index(win_from(a)) for a in dectree.ACTIONS], dtype=np.intp)
+WIN, DRAW, LOSS = [dectree.OUTCOMES.index(o) for o in ("win", "draw", "loss")]
+
+def outcomeSymbol(o):
+    """
+    dectree.OUTCOMES code -> code into dectree.SYMBOLS
+    """
+    return len(dectree.ACTIONS) + o
+
+class Opponent(object):
+    """
+    A player for ngames games at once. first and next return action codes
+    for all games; next gets the codes of the round just played
+    """
+
+    def __init__(self, ngames, rng):
+        self.ngames = ngames
+        self.rng    = rng
+
+    def lengths(self, length):
+        return np.full(self.ngames, length, dtype=np.intp)
+
+    def first(self):
+        return self.rng.randint(3, size=self.ngames)
+
+    def next(self, player, ai):
+        return self.rng.randint(3, size=self.ngames)
+
+class CyclicOpponent(Opponent):
+    """
+    bots.CyclicBot: plays what beats its own last action, with noise
+    """
+
+    noise = 0.1
+
+    def next(self, player, ai):
+        noisy = self.rng.rand(self.ngames) < self.noise
+        return np.where(noisy, self.rng.randint(3, size=self.ngames), WIN_FROM[player])
+
+class WinStayLoseShiftOpponent(Opponent):
+    """
+    bots.WinStayLoseShiftBot
+    """
+
+    def next(self, player, ai):
+        return np.where(OUTCOME[player, ai] == WIN, player, WIN_FROM[ai])
+
+class ReplayOpponent(Opponent):
+    """
+    Replays the player's moves of recorded games, whatever the AI does
+    """
+
+    def __init__(self, ngames, rng, games):
+        Opponent.__init__(self, ngames, rng)
+        self.games  = [games[i] for i in rng.randint(len(games), size=ngames)]
+        self.moves  = np.zeros((ngames, max([len(g) for g in self.games] + [1])), dtype=np.intp)
+        for i, g in enumerate(self.games):
+            self.moves[i, :len(g)] = g
+        self.t = 0
+
+    def lengths(self, length):
+        return np.array([len(g) for g in self.games], dtype=np.intp)
+
+    def first(self):
+        self.t = 0
+        return self.moves[:, 0]
+
+    def next(self, player, ai):
+        self.t = min(self.t + 1, self.moves.shape[1] - 1)
+        return self.moves[:, self.t]
+
+OPPONENTS = {
+    'random': Opponent,
+    'cyclic': CyclicOpponent,
+    'wsls':   WinStayLoseShiftOpponent,
+    'replay': ReplayOpponent,
+}
+
+def entrants():
+    return list(strategies.REGISTRY) + ["selector"]
+
+def strategyNames(name):
+    return strategies.DEFAULT if name == "selector" else [name]
+
+# per worker process: the strategies' shared resources and the replay games
+_shared  = None
+_replays = None
+
+def openHistory(workdir):
+    """
+    Opens the training log and tree cache written by prepareHistory
+    """
+    log = gamelog.GameLog(*[os.path.join(workdir, f) for f in (gamelog.LOG_FILE, gamelog.INDEX_FILE, gamelog.HEAD_FILE)], legacy_file=None)
+    return treecache.TreeCache(log, os.path.join(workdir, treecache.CACHE_FILE))
+
+def prepareHistory(history_dir, workdir, holdout, seed):
+    """
+    Splits the game log in history_dir: a random holdout share of the
+    games is kept for replay, the rest is copied to a training log in
+    workdir. Returns the replay games as arrays of player action codes
+    """
+    paths = [os.path.join(history_dir, f) for f in (gamelog.LOG_FILE, gamelog.INDEX_FILE, gamelog.HEAD_FILE, gamelog.LEGACY_FILE)]
+    log   = gamelog.GameLog(*paths)
+    order = np.random.RandomState(seed).permutation(len(log))
+    nreplay = int(round(holdout * len(log)))
+    replays = [log.codes(i)[0].astype(np.intp) for i in sorted(order[:nreplay])]
+    training = openHistory(workdir)
+    games = [log.packed(i) for i in sorted(order[nreplay:])]
+    if games:
+        training.log.appendPacked(games)
+    return replays
+
+def initWorker(workdir, replays, quiet):
+    global _shared, _replays
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    _shared  = strategies.Shared(openHistory(workdir))
+    _replays = replays
+
+def play(task):
+    """
+    Plays one batch of games of a strategy against an opponent and returns
+    the tallies
+    """
+    name, opponent, ngames, length, seed = task
+    rng = np.random.RandomState(seed)
+    if opponent == "replay":
+        if not _replays:
+            return name, opponent, None
+        players = ReplayOpponent(ngames, rng, _replays)
+    else:
+        players = OPPONENTS[opponent](ngames, rng)
+    lengths   = players.lengths(length)
+    features  = [gamefeatures.GameFeatures(max(int(n), 1)) for n in lengths]
+    selectors = [strategies.Selector(strategyNames(name), f, _shared) for f in features]
+    predicted = rng.randint(3, size=ngames)
+    ai        = WIN_FROM[predicted]
+    player    = players.first()
+    tally     = np.zeros(3, dtype=np.int64)
+    hits = moves = 0
+    seconds = 0.0
+    for t in range(int(lengths.max()) if ngames > 0 else 0):
+        active   = np.flatnonzero(t < lengths)
+        outcomes = OUTCOME[player, ai]
+        tally   += np.bincount(outcomes[active], minlength=3)
+        hits    += int(np.sum(predicted[active] == player[active]))
+        moves   += len(active)
+        guesses  = rng.randint(3, size=ngames)
+        start    = time.perf_counter()
+        for g in active:
+            features[g].append(player[g], outcomeSymbol(outcomes[g]), predicted[g], ai[g])
+            guess = selectors[g].step(int(player[g]))
+            if guess is not None:
+                guesses[g] = dectree.ACTIONS.index(guess)
+        seconds += time.perf_counter() - start
+        predicted = guesses
+        player, ai = players.next(player, ai), WIN_FROM[predicted]
+    # the tally is from the player's side
+    return name, opponent, {"games": ngames, "moves": moves, "ai_wins": int(tally[LOSS]), "draws": int(tally[DRAW]),
+                            "ai_losses": int(tally[WIN]), "hits": hits, "seconds": seconds}
+
+def tournament(names, opponents, ngames, length, workdir, replays, workers=None, batch=25, seed=0, quiet=True):
+    tasks = []
+    for name in names:
+        for opponent in opponents:
+            for start in range(0, ngames, batch):
+                tasks.append((name, opponent, min(batch, ngames - start), length, seed + 7919 * len(tasks)))
+    totals = {}
+    pool = multiprocessing.Pool(workers, initializer=initWorker, initargs=(workdir, replays, quiet))
+    try:
+        for name, opponent, result in pool.imap_unordered(play, tasks):
+            if result is None:
+                continue
+            total = totals.setdefault((name, opponent), dict((k, 0) for k in result))
+            for k, v in result.items():
+                total[k] += v
+    finally:
+        pool.close()
+        pool.join()
+    results = []
+    for (name, opponent), t in sorted(totals.items()):
+        results.append(dict(t, strategy=name, opponent=opponent,
+                            win_rate=t["ai_wins"] / float(t["moves"]), draw_rate=t["draws"] / float(t["moves"]),
+                            loss_rate=t["ai_losses"] / float(t["moves"]), hit_rate=t["hits"] / float(t["moves"]),
+                            us_per_move=1e6 * t["seconds"] / t["moves"]))
+    return results
+
+def report(results):
+    print("%-10s %-8s %7s %7s %7s %7s %10s"%("strategy", "opponent", "win", "draw", "loss", "hits", "us/move"))
+    for r in results:
+        print("%-10s %-8s %7.3f %7.3f %7.3f %7.3f %10.1f"%(r["strategy"], r["opponent"], r["win_rate"], r["draw_rate"], r["loss_rate"], r["hit_rate"], r["us_per_move"]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play the AI strategies against bots and recorded games")
+    parser.add_argument("-strategies", nargs="+", default=entrants(), choices=entrants())
+    parser.add_argument("-opponents", nargs="+", default=sorted(OPPONENTS), choices=sorted(OPPONENTS))
+    parser.add_argument("-games", type=int, default=200, help="games per strategy and opponent")
+    parser.add_argument("-length", type=int, default=60, help="rounds per game against the bots")
+    parser.add_argument("-history", default=".", help="directory holding the game log")
+    parser.add_argument("-holdout", type=float, default=0.2, help="share of the logged games replayed instead of learned from")
+    parser.add_argument("-workers", type=int, default=None, help="processes (default: one per core)")
+    parser.add_argument("-batch", type=int, default=25, help="games played in lockstep per task")
+    parser.add_argument("-seed", type=int, default=0)
+    parser.add_argument("-o", dest="output", default=None, help="JSON file to write the results to")
+    arguments = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rps-tournament-")
+    try:
+        replays = prepareHistory(arguments.history, workdir, arguments.holdout, arguments.seed)
+        print("Replaying %d games, learning from the other %d"%(len(replays), len(openHistory(workdir).log)))
+        history = openHistory(workdir)
+        if any("dectree" in strategyNames(name) for name in arguments.strategies):
+            for nturns in (1, 2):
+                history.get(nturns)
+        start = time.perf_counter()
+        results = tournament(arguments.strategies, arguments.opponents, arguments.games, arguments.length, workdir, replays,
+                             arguments.workers, arguments.batch, arguments.seed)
+        duration = time.perf_counter() - start
+        report(results)
+        print("%d moves in %.1fs"%(sum(r["moves"] for r in results), duration))
+        if arguments.output is not None:
+            with open(arguments.output, "w") as f:
+                json.dump({"config": vars(arguments), "seconds": duration, "results": results}, f, indent=2)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,185 @@
+import os
+import pickle
+import threading
+import dectree
+import gamelog
+import gamefeatures
+import historywriter
+import treepool
+
+CACHE_FILE = "historical_trees.pkl"
+
+class TreeCache(object):
+    """
+    Keeps one fitted Dectree per (game index, nturns) for the historical
+    games, so trees are built once instead of on every move. The cache is
+    stored next to the game log, only ever appended to: every save adds
+    a record of the new trees, stamped with the log signature they were
+    fitted for. It is thrown away whenever the log changes behind our
+    back. It can be shared between threads; the ensembles it hands out
+    are never modified. A commit writes the log, fits and saves the new
+    trees without holding the lock requests take, which it only takes to
+    swap the results in.
+
+    With asynchronous=True, append only queues the game: a HistoryWriter
+    thread commits it to the log in a batch and then fits its trees.
+    Missing trees are fitted on a treepool process pool of workers
+    processes (default one per core) when there are many of them; an
+    asynchronous cache starts that pool before its writer thread
+    """
+
+    def __init__(self, log=None, cache_file=CACHE_FILE, asynchronous=False, workers=None):
+        self.log        = gamelog.GameLog() if log is None else log
+        self.cache_file = cache_file
+        self.workers    = workers
+        self.lock       = threading.RLock()
+        # serializes commits, and reloads against them; requests never wait for it
+        self.commit_lock = threading.Lock()
+        self.save_lock  = threading.Lock()
+        if asynchronous:
+            # fork the fitting pool before the writer thread exists
+            treepool.prefork(workers)
+        self.writer     = historywriter.HistoryWriter(self.__commit) if asynchronous else None
+        self.reload()
+
+    def reload(self):
+        with self.lock:
+            print("Loading previous game data from %s"%(self.log.log_file))
+            self.log.reload()
+            self.stamp = self.log.signature()
+            self.ngames = len(self.log)
+            self.trees = {}
+            self.ensembles = {}
+            stamp, trees = self.load()
+            if stamp is not None and stamp == self.stamp:
+                print("Loading %d cached trees from %s"%(len(trees), self.cache_file))
+                self.trees = trees
+            else:
+                # start over, so new records are not appended to stale ones
+                try:
+                    os.remove(self.cache_file)
+                except OSError:
+                    pass
+
+    def load(self):
+        """
+        Reads the records of the cache file. Returns the stamp of the last
+        one and the trees of all of them. A record cut short by a crash is
+        cut off the file
+        """
+        stamp, trees, end = None, {}, 0
+        try:
+            with open(self.cache_file, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                while end < size:
+                    try:
+                        stamp, record = pickle.load(f)
+                    except Exception:
+                        break
+                    trees.update(record)
+                    end = f.tell()
+            if end < size:
+                with open(self.cache_file, "r+b") as f:
+                    f.truncate(end)
+        except Exception:
+            pass
+        return stamp, trees
+
+    def save(self, trees):
+        """
+        Appends the trees fitted since the last save as one record
+        """
+        try:
+            with self.save_lock, open(self.cache_file, "ab") as f:
+                pickle.dump((self.stamp, trees), f, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print("Could not save tree cache to %s: %s"%(self.cache_file, str(e)))
+
+    def get(self, nturns):
+        """
+        Returns the trees of all historical games for nturns, building
+        (and persisting) only the ones that are not cached yet
+        """
+        with self.lock:
+            # while a commit holds commit_lock the change is its own
+            if self.log.signature() != self.stamp and self.commit_lock.acquire(False):
+                try:
+                    print("Game history changed on disk. Reloading tree cache")
+                    self.reload()
+                finally:
+                    self.commit_lock.release()
+            n = self.ngames
+            missing = [i for i in range(n) if (i, nturns) not in self.trees]
+            if missing:
+                trees = treepool.fitPacked([self.log.packed(i) for i in missing], nturns, self.workers)
+                trees = dict(((i, nturns), tree) for i, tree in zip(missing, trees))
+                self.trees.update(trees)
+                self.save(trees)
+            return [t for t in (self.trees[(i, nturns)] for i in range(n)) if t is not None]
+
+    def ensemble(self, nturns):
+        """
+        Returns the trees for nturns as a DectreeEnsemble
+        """
+        with self.lock:
+            trees = self.get(nturns)
+            if nturns not in self.ensembles:
+                self.ensembles[nturns] = dectree.DectreeEnsemble(trees)
+            return self.ensembles[nturns]
+
+    def append(self, player_game, outcome_game, prediction_game, ai_game):
+        """
+        Saves a finished game to the game log and fits its trees for every
+        nturns already in the cache. Only this game is checked for
+        integrity
+        """
+        if not dectree.checkGameIntegrity(player_game, outcome_game, prediction_game, ai_game):
+            print("Game integrity not guaranteed. Boldly refusing to save the data")
+            return
+        packed = gamelog.pack(player_game, outcome_game, prediction_game, ai_game)
+        if self.writer is None:
+            self.__commit([packed])
+        else:
+            self.writer.submit(packed)
+
+    def close(self, timeout=historywriter.CLOSE_TIMEOUT):
+        """
+        Waits until all queued games are saved, at most timeout seconds
+        """
+        if self.writer is not None:
+            self.writer.close(timeout)
+
+    def __commit(self, packed_games):
+        with self.commit_lock:
+            self.log.appendPacked(packed_games)
+            stamp = self.log.signature()
+            first = len(self.log) - len(packed_games)
+            print("Saved games %d to %d to %s"%(first, len(self.log)-1, self.log.log_file))
+            with self.lock:
+                nturns_cached = set(k[1] for k in self.trees) | set(self.ensembles)
+                ensembles = dict(self.ensembles)
+            trees = {}
+            for i, packed in enumerate(packed_games, first):
+                features = gamefeatures.GameFeatures.fromCodes(gamelog.unpack(packed))
+                for nturns in nturns_cached:
+                    trees[(i, nturns)] = dectree.fitDectree(features, nturns)
+            # only the new games' trees are compiled into the ensembles
+            for nturns, ensemble in ensembles.items():
+                new = (trees[(i, nturns)] for i in range(first, len(self.log)))
+                ensembles[nturns] = (ensemble, ensemble.extended([t for t in new if t is not None]))
+            with self.lock:
+                self.trees.update(trees)
+                self.stamp  = stamp
+                self.ngames = len(self.log)
+                for nturns in list(self.ensembles):
+                    ensemble, extended = ensembles.get(nturns, (None, None))
+                    if self.ensembles[nturns] is ensemble:
+                        self.ensembles[nturns] = extended
+                    else:
+                        # built over the old games while we were fitting
+                        del self.ensembles[nturns]
+            # also when there are no new trees, to stamp the cache with the new log
+            self.save(trees)
+
+    def __len__(self):
+        return len(self.log)
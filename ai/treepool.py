@@ -0,0 +1,87 @@
+import atexit
+import multiprocessing
+import threading
+import numpy as np
+import dectree
+import gamefeatures
+import gamelog
+
+# below this many games, fitting in-process is cheaper than shipping them
+MIN_PARALLEL = 32
+# batches per worker, so that uneven games still balance
+BATCHES_PER_WORKER = 4
+
+_lock = threading.Lock()
+_pool = None
+_size = 0
+
+def fitBatch(task):
+    """
+    Fits the trees of a batch of games, shipped as their packed rounds
+    (gamelog.pack) back to back and the end offset of every game
+    """
+    data, ends, nturns = task
+    data  = np.frombuffer(data, dtype=np.uint8)
+    trees = []
+    start = 0
+    for end in ends.tolist():
+        trees.append(dectree.fitDectree(gamefeatures.GameFeatures.fromCodes(gamelog.unpack(data[start:end])), nturns))
+        start = end
+    return trees
+
+def batch(packed_games, nturns):
+    ends = np.cumsum([len(p) for p in packed_games]).astype(np.uint32)
+    data = b"".join(np.asarray(p, dtype=np.uint8).tobytes() for p in packed_games)
+    return data, ends, nturns
+
+def pool(workers=None):
+    """
+    Returns the process pool, started on first use and then kept for the
+    life of the process. Workers are forked where possible, so they start
+    with dectree already imported
+    """
+    global _pool, _size
+    with _lock:
+        if _pool is None:
+            _size = workers or multiprocessing.cpu_count()
+            if "fork" in multiprocessing.get_all_start_methods():
+                _pool = multiprocessing.get_context("fork").Pool(_size)
+            else:
+                _pool = multiprocessing.Pool(_size)
+            atexit.register(close)
+        return _pool
+
+def prefork(workers=None):
+    """
+    Starts the pool now if fitPacked would fork one later. Forking while
+    other threads run can leave a worker holding a lock one of them had
+    taken, so a caller that starts threads calls this first
+    """
+    if (workers or multiprocessing.cpu_count()) > 1 and "fork" in multiprocessing.get_all_start_methods():
+        pool(workers)
+
+def close():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.close()
+            _pool.join()
+            _pool = None
+
+def fitPacked(packed_games, nturns, workers=None):
+    """
+    Fits one tree per game, given as packed rounds, like fitDectree does.
+    With enough games the fitting is fanned out over the process pool in
+    contiguous batches; workers=1 keeps it in this process. Returns the
+    trees in the order of the games (None for games too short to fit)
+    """
+    packed_games = list(packed_games)
+    if workers is None:
+        workers = _size or multiprocessing.cpu_count()
+    if workers <= 1 or len(packed_games) < MIN_PARALLEL:
+        return fitBatch(batch(packed_games, nturns))
+    p = pool(workers)
+    nbatches = min(len(packed_games), BATCHES_PER_WORKER * _size)
+    bounds   = np.linspace(0, len(packed_games), nbatches + 1).astype(int)
+    tasks    = [batch(packed_games[a:b], nturns) for a, b in zip(bounds[:-1], bounds[1:])]
+    return [tree for trees in p.map(fitBatch, tasks) for tree in trees]
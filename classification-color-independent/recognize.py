@@ -1,154 +1,111 @@
+"""
+python recognize.py
+python recognize.py -source recording.mp4 -headless
+
+Needs the classification directory next to this one: its gestures
+(publishing), pipeline (sources and stage timing) and temporal (change
+detection and smoothing) modules are imported from ../classification.
+"""
 # organize imports
+import os
+import sys
+import time
+import argparse
 import cv2
 # import imutils
 import numpy as np
 from keras.models import load_model
-import redis
 
-# global variables
-bg = None
-redis = redis.StrictRedis(host='localhost', port=6379, charset='utf-8', decode_responses=True)
-
-# -------------------------------------------------------------------------------
-# Function - To find the running average over the background
-# -------------------------------------------------------------------------------
+# gestures, pipeline and temporal are shared with ../classification
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "classification"))
+import gestures
+import pipeline
+import temporal
+from segmentation import Segmenter
 
+# global variables
+publisher = gestures.GesturePublisher()
 
-def run_avg(image, accumWeight):
-    global bg
-    # initialize the background
-    if bg is None:
-        bg = image.copy().astype("float")
-        return
+LABELS = ["rock", "paper", "scissors"]
 
-    # compute weighted average, accumulate it and update the background
-    cv2.accumulateWeighted(image, bg, accumWeight)
+x, y, r = 500, 900, 200
+# region of interest (ROI) coordinates
+ROI = (x-r, y-r, x+r, y+r)
 
 # -------------------------------------------------------------------------------
-# Function - To segment the region of hand in the image
+# Function - Segment, classify and publish the hand in every frame
 # -------------------------------------------------------------------------------
 
 
-def segment(image, threshold=10):
-    global bg
-    # find the absolute difference between background and current frame
-    diff = cv2.absdiff(bg.astype("uint8"), image)
-
-    # threshold the diff image so that we get the foreground
-    thresholded = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)[1]
-
-    thresholded = cv2.GaussianBlur(thresholded, (5, 5), 0)
-
-    # get the contours in the thresholded image
-    # print(cv2.findContours(thresholded.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
-    im2, cnts, hierarchy = cv2.findContours(thresholded.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    print(cnts)
-
-    # return None, if no contours detected
-    if len(cnts) == 0:
-        return
-    else:
-        # based on contour area, get the maximum contour which is the hand
-        segmented = max(cnts, key=cv2.contourArea)
-        return (thresholded, segmented)
-
-# -------------------------------------------------------------------------------
-#  Main function
-# -------------------------------------------------------------------------------
-
+def recognize(model, source="0", headless=False, max_frames=None):
+    top, right, bottom, left = ROI
+    timer = pipeline.StageTimer()
+    segmenter = Segmenter(ROI, timer=timer)
 
-if __name__ == "__main__":
-    model = load_model("model.h5")
-    # initialize accumulated weight
-    accumWeight = 0.5
+    # classify again only when the hand moves, publish stable gestures
+    detector = temporal.ChangeDetector()
+    smoother = temporal.Smoother(LABELS)
+    preds = None
 
     im_count = 0
-
-    # get the reference to the webcam
-    camera = cv2.VideoCapture(0)
-
-    x, y, r = 500, 900, 200
-    # region of interest (ROI) coordinates
-    top, right, bottom, left = x-r, y-r, x+r, y+r
-
-    # initialize num of frames
     num_frames = 0
+    classified = 0
 
-    # calibration indicator
-    calibrated = False
+    # the webcam, a recording or synthetic frames; without a window a
+    # recording is read as fast as it can be processed
+    camera = pipeline.openSource(source, nframes=max_frames, realtime=not headless)
 
     # keep looping, until interrupted
-    while(True):
+    while max_frames is None or num_frames < max_frames:
+        start = time.time()
+
         # get the current frame
         (grabbed, frame) = camera.read()
-
-        # flip the frame so that it is not the mirror view
-        frame = cv2.flip(frame, 1)
-
-        # clone the frame
-        clone = frame.copy()
-
-        # get the height and width of the frame
-        (height, width) = frame.shape[:2]
-
-        # get the ROI
-        roi = frame[top:bottom, right:left]
-
-        # convert the roi to grayscale and blur it
-        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (7, 7), 0)
-
-        # to get the background, keep looking till a threshold is reached
-        # so that our weighted average model gets calibrated
-        if num_frames < 30:
-            run_avg(gray, accumWeight)
-            if num_frames == 1:
-                print("[STATUS] please wait! calibrating...")
-            elif num_frames == 29:
-                print("[STATUS] calibration successfull...")
-        else:
-            # segment the hand region
-            hand = segment(gray)
-
-            # check whether hand region is segmented
-            if hand is not None:
-                # if yes, unpack the thresholded image and
-                # segmented region
-
-                (thresholded, segmented) = hand
-                epsilon = 0.01*cv2.arcLength(segmented, True)
-                segmented = cv2.approxPolyDP(segmented, epsilon, True)
-
-                # draw the segmented region and display the frame
-                convex_hull = cv2.convexHull(segmented)
-
-                cv2.rectangle(clone, (left, top), (right, bottom), (0, 0, 0), thickness=cv2.FILLED)
-                cv2.drawContours(clone, [convex_hull + (right, top)], -1, (255, 0, 0), thickness=cv2.FILLED)
-                cv2.drawContours(clone, [segmented + (right, top)], -1, (0, 255, 255), thickness=cv2.FILLED)
-
-                preds = model.predict(cv2.resize(clone[top:bottom, right:left], (64, 64)).reshape((-1, 64, 64, 3)))[0]
-                index = np.argmax(preds)
-                pred_class = ["rock", "paper", "scissors"][index]
-                text = pred_class + " " + str(round(preds[index], 2))
-                redis.set('foo', str(pred_class))
-                cv2.putText(clone, text, (right, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-
-                # show the thresholded image
-                # cv2.imshow("Thesholded", thresholded)
-
-        # draw the segmented hand
-        cv2.rectangle(clone, (left, top), (right, bottom), (0, 255, 0), 2)
-
-        # increment the number of frames
+        if not grabbed:
+            break
+        timer.add("capture", time.time() - start)
+
+        # segment the hand region, once the background is calibrated
+        data = segmenter.process(frame)
+        if segmenter.frames == 1:
+            print("[STATUS] please wait! calibrating...")
+        elif segmenter.frames == segmenter.calibration_frames:
+            print("[STATUS] calibration successfull...")
+
+        text = None
+        if data is not None:
+            # every segmented frame is checked, the first one too
+            sample = detector.sample(segmenter.blurred)
+            if detector.changed(sample) or preds is None:
+                predicted = time.time()
+                preds = model.predict(data, batch_size=1, verbose=0)[0]
+                timer.add("predict", time.time() - predicted)
+                detector.classified(sample)
+                classified += 1
+            pred_class, confidence = smoother.update(preds)
+            if pred_class is not None:
+                text = pred_class + " " + str(round(confidence, 2))
+                publisher.publish(pred_class, confidence)
+
+        timer.add("total", time.time() - start)
         num_frames += 1
 
+        if headless:
+            continue
+
         # display the frame with segmented hand
+        clone = segmenter.draw(frame)
+        if text is not None:
+            cv2.putText(clone, text, (right, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
         cv2.imshow("Video Feed", clone)
 
         # observe the keypress by the user
         keypress = cv2.waitKey(1) & 0xFF
 
         # if the user pressed "q", then stop looping
+        if keypress == ord("q"):
+            break
+
         path = None
         if keypress == ord("r"):
             path = "r" + str(im_count) + ".png"
@@ -162,6 +119,34 @@ if __name__ == "__main__":
             print("saved", path)
             im_count += 1
 
-# free up memory
-camera.release()
-cv2.destroyAllWindows()
+    # free up memory
+    camera.release()
+    if not headless:
+        cv2.destroyAllWindows()
+
+    pipeline.printReport(timer.report())
+    print("classified {} of {} segmented frames".format(classified, detector.checked))
+
+# -------------------------------------------------------------------------------
+#  Main function
+# -------------------------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Segment and classify the hand")
+    parser.add_argument("-model",
+                        default="model.h5",
+                        help='model file')
+    parser.add_argument("-source",
+                        default="0",
+                        help='camera index, video file or "synthetic"')
+    parser.add_argument("-headless",
+                        action="store_true",
+                        help='do not show the video')
+    parser.add_argument("-frames",
+                        type=int,
+                        default=None,
+                        help='stop after this many frames')
+    arguments = parser.parse_args()
+
+    recognize(load_model(arguments.model), arguments.source, arguments.headless, arguments.frames)
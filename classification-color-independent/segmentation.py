@@ -0,0 +1,124 @@
+"""
+Background subtraction and hand segmentation for recognize.py, on the
+region of interest only.
+
+The ROI is mirrored out of the camera frame into a buffer of its own, so
+the full frame is neither flipped nor copied; every later step writes
+into buffers allocated once. The background is a running average of the
+first calibration frames, kept as uint8 once calibrated. The model input
+is drawn from the segmented contour on an ROI-sized canvas and resized
+straight into the 64x64 input batch.
+"""
+
+import cv2
+import numpy as np
+
+# what the model was trained on: the convex hull and the hand filled in
+# on a black ROI
+HULL_COLOR = (255, 0, 0)
+HAND_COLOR = (0, 255, 255)
+
+
+class Segmenter(object):
+    """
+    process(frame) returns the (1, size, size, 3) uint8 model input for
+    the hand in the ROI, or None while calibrating or when no hand is
+    found. roi is (top, right, bottom, left) in the mirrored frame, as
+    recognize.py has always had it
+    """
+
+    def __init__(self, roi, calibration_frames=30, accum_weight=0.5, threshold=10, size=64, timer=None):
+        self.top, self.right, self.bottom, self.left = roi
+        self.calibration_frames = calibration_frames
+        self.accum_weight = accum_weight
+        self.threshold    = threshold
+        self.timer        = timer
+        height, width     = self.bottom - self.top, self.left - self.right
+        self.roi          = np.zeros((height, width, 3), dtype=np.uint8)
+        self.gray         = np.zeros((height, width), dtype=np.uint8)
+        self.blurred      = np.zeros((height, width), dtype=np.uint8)
+        # float64 as before: only updated while calibrating, and float32
+        # rounding shifts the uint8 background and so the contours
+        self.background   = np.zeros((height, width), dtype=np.float64)
+        self.background8  = np.zeros((height, width), dtype=np.uint8)
+        self.diff         = np.zeros((height, width), dtype=np.uint8)
+        self.mask         = np.zeros((height, width), dtype=np.uint8)
+        self.smoothed     = np.zeros((height, width), dtype=np.uint8)
+        self.canvas       = np.zeros((height, width, 3), dtype=np.uint8)
+        self.input        = np.zeros((1, size, size, 3), dtype=np.uint8)
+        self.size         = size
+        self.frames       = 0
+        # the last segmented contour and its hull, in ROI coordinates
+        self.hand         = None
+        self.hull         = None
+
+    def calibrated(self):
+        return self.frames > self.calibration_frames
+
+    def time(self, stage, start):
+        now = cv2.getTickCount()
+        if self.timer is not None:
+            self.timer.add(stage, (now - start) / cv2.getTickFrequency())
+        return now
+
+    def crop(self, frame):
+        """
+        The ROI of the mirrored frame, mirrored out of the frame as it is
+        """
+        width = frame.shape[1]
+        cv2.flip(frame[self.top:self.bottom, width - self.left:width - self.right], 1, dst=self.roi)
+        return self.roi
+
+    def process(self, frame):
+        start = cv2.getTickCount()
+        self.crop(frame)
+        cv2.cvtColor(self.roi, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        cv2.GaussianBlur(self.gray, (7, 7), 0, dst=self.blurred)
+        start = self.time("roi", start)
+
+        self.frames += 1
+        if not self.calibrated():
+            # running average over the background
+            if self.frames == 1:
+                self.background[:] = self.blurred
+            else:
+                cv2.accumulateWeighted(self.blurred, self.background, self.accum_weight)
+            if self.frames == self.calibration_frames:
+                np.copyto(self.background8, self.background, casting="unsafe")
+            self.time("background", start)
+            return None
+
+        # foreground: the thresholded difference with the background
+        cv2.absdiff(self.background8, self.blurred, dst=self.diff)
+        cv2.threshold(self.diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self.mask)
+        cv2.GaussianBlur(self.mask, (5, 5), 0, dst=self.smoothed)
+        start = self.time("segment", start)
+
+        # the largest contour is the hand; OpenCV 3 returns the image too
+        contours = cv2.findContours(self.smoothed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        if len(contours) == 0:
+            self.hand = self.hull = None
+            self.time("contours", start)
+            return None
+        hand = max(contours, key=cv2.contourArea)
+        self.hand = cv2.approxPolyDP(hand, 0.01 * cv2.arcLength(hand, True), True)
+        self.hull = cv2.convexHull(self.hand)
+        start = self.time("contours", start)
+
+        self.canvas[:] = 0
+        cv2.drawContours(self.canvas, [self.hull], -1, HULL_COLOR, thickness=cv2.FILLED)
+        cv2.drawContours(self.canvas, [self.hand], -1, HAND_COLOR, thickness=cv2.FILLED)
+        cv2.resize(self.canvas, (self.size, self.size), dst=self.input[0])
+        self.time("draw", start)
+        return self.input
+
+    def draw(self, frame):
+        """
+        The mirrored frame for display, with the segmented hand drawn into
+        the ROI
+        """
+        shown = cv2.flip(frame, 1)
+        if self.hand is not None:
+            shown[self.top:self.bottom, self.right:self.left] = self.canvas
+        cv2.rectangle(shown, (self.left, self.top), (self.right, self.bottom), (0, 255, 0), 2)
+        return shown
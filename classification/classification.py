@@ -1,5 +1,6 @@
 """
 python classification.py -type simple
+python classification.py -type simple -source video.mp4 -headless
 """
 
 import cv2
@@ -7,21 +8,28 @@ import numpy as np
 import argparse
 import os
 import time
-import redis
 
 os.environ['KERAS_BACKEND'] = 'tensorflow'
 
-from keras import backend as K
-from keras.models import load_model
-from keras.applications import VGG16, MobileNet
-
 from utils import *
+import gestures
+import inference_server
+import pipeline
+import temporal
+from preprocess import Preprocessor
 
-r = redis.StrictRedis(host='localhost', port=6379, charset='utf-8', decode_responses=True)
+# gesture publishers by stream, kept across restarts of classify
+publishers = {}
 
 LEARN_DIR = "data/learn"
 
 
+def get_publisher(stream=None):
+    if stream not in publishers:
+        publishers[stream] = gestures.GesturePublisher(stream=stream)
+    return publishers[stream]
+
+
 def learn(frame, pred_class, image_dir=LEARN_DIR, shape=(64, 64)):
         "Save image with predicted class so it can be used for training later"
 
@@ -35,93 +43,94 @@ def learn(frame, pred_class, image_dir=LEARN_DIR, shape=(64, 64)):
         cv2.imwrite(path, hand_img_resize)
 
 
-def classify(model_type):
+def classify(model_type, source="0", headless=False, max_frames=None, precision="float32", server=None,
+             smoothing="majority", threshold=4.0):
     """
-    Use opencv2 to classify PRS images
+    Use opencv2 to classify PRS images. Capture, preprocessing and
+    inference run pipelined (see pipeline.py); display and publishing
+    happen on this thread. Frames that hardly differ from the last
+    classified one are not classified again, and the gesture is only
+    published once it is stable (see temporal.py)
     """
 
-
-    model = load_model(MODEL_DICT[model_type]['model_file'])
-    width = MODEL_DICT[model_type]['width']
-    height = MODEL_DICT[model_type]['height']
-
-    if model_type == 'vgg':
-        HAND_TYPE_STRING_LIST = ['paper', 'rock', 'scissors']
-        model_vgg = VGG16(include_top=False, weights='imagenet')
-    elif model_type == 'mobilenet':
-        #HAND_TYPE_STRING_LIST = ['nothing', 'paper', 'rock', 'scissors']
-        HAND_TYPE_STRING_LIST = ['paper', 'rock', 'scissors']
-        model_vgg = MobileNet(include_top=False, weights='imagenet', alpha=0.25, input_shape=(width, height, 3))
+    # loaded once per process, so restarts do not reload the weights; with
+    # a server the model is shared with the other stations
+    if server is not None:
+        model = inference_server.InferenceClient(source, server)
+        # several stations share the channel, so tag the events
+        publisher = get_publisher(str(source))
     else:
-        HAND_TYPE_STRING_LIST = ['paper', 'rock', 'scissors']
-
-    # start camera
-    cap = cv2.VideoCapture(0)
+        import models
+        model = models.REGISTRY.get(model_type, precision)
+        publisher = get_publisher()
+    width = model.width
+    height = model.height
+
+    # crops the mirrored capture region, resizes and scales it into one of
+    # three reused buffers, which infer hands back once it has predicted
+    preprocessor = Preprocessor(width, height, slots=3)
+    detector = temporal.ChangeDetector(threshold)
+    smoother = temporal.Smoother(model.labels, smoothing)
+    last = [None]
+    classified = [0]
+
+    def preprocess(frame):
+        # None when the hand has not moved, to reuse the last classification
+        sample = detector.sample(preprocessor.crop(frame))
+        if not detector.changed(sample):
+            return None
+        return preprocessor(frame), sample
+
+    def release(data):
+        if data is not None:
+            preprocessor.release(data[0])
+
+    def infer(data):
+        # make classification; None before the first one. Only now is the
+        # crop the one later frames are compared with
+        if data is not None:
+            batch, sample = data
+            last[0] = model.predict(batch)[0]
+            release(data)
+            detector.classified(sample)
+            classified[0] += 1
+        return last[0]
+
+    def output(frame, classification):
+        result_string, confidence = smoother.update(classification)
 
-    while(1):
-
-        # Capture frames from the camera
-        _, frame = cap.read()
+        # save all images, so gather training data
+        # learn(frame, result_string[0])
 
-        # flip frame to align the movement
-        frame = cv2.flip(frame, 1)
+        if result_string is not None and publisher.publish(result_string, confidence):
+            print("Classified as ", classification)
 
-        # backup the frame to draw capture area
-        show_frame = frame
+        if headless:
+            return True
 
-        # draw capture region
+        # draw capture region on the flipped frame
+        show_frame = cv2.flip(frame, 1)
         cv2.rectangle(show_frame, CAP_REGION_LEFTTOP, CAP_REGION_RIGHTBOTTOM, CAP_COLOR, 2)
 
-        # get hand images
-        hand_img = frame[CAP_REGION_Y:CAP_REGION_BOTTOM, CAP_REGION_X:CAP_REGION_RIGHT, :]
-
-        try:
-            hand_img_resize = resize_from_array(hand_img, width, height)
-        except:
-            cap = cv2.VideoCapture(0)
-            continue
-
-        # Add an extra dimension, and scale the image pixel value
-        data = np.expand_dims(hand_img_resize, axis=0)
-        data = data / 255.0  # scale, very important!
-
-
-        # make classification
-        if model_type == 'vgg' or model_type == 'mobilenet':
-            input_data = model_vgg.predict(data, batch_size=1, verbose=0)
-        else:
-            input_data = data
-
-        classification = model.predict(input_data, batch_size=1, verbose=0)[0]
-        if model_type == 'mobilenet':
-            #classification[0] *= 0.05  # inhibit nothing
-            # classification[0] = 0
-            # classification /= classification[1:].sum()
-            classification = classification[1:]/np.sum(classification[1:])
-
-        print("Classified as ", classification)
-        result_string = HAND_TYPE_STRING_LIST[np.argmax(classification)]
-
-        # save all images, so gather training data
-        # learn(frame, result_string[0])
-
-        r.set('foo', str(result_string))
-        print("In the database is ", r.get('foo'))
-
         cv2.putText(show_frame,
-                        result_string,
+                        result_string or '',
                         (PREDICT_TEXT_REGION_X, PREDICT_TEXT_REGION_Y),
                         cv2.FONT_HERSHEY_SIMPLEX, 5, 255)
 
         cv2.imshow('Dilation', show_frame)
 
         # waiting for keyboard input
-        k = cv2.waitKey(300) & 0xFF
-        if k == 27:  # close the output video by pressing 'ESC'
-            break
+        k = cv2.waitKey(1) & 0xFF
+        return k != 27  # close the output video by pressing 'ESC'
+
+    stream = pipeline.Pipeline(pipeline.openSource(source, nframes=max_frames), preprocess, infer, output,
+                               release=release)
+    report = stream.run(max_frames)
+    pipeline.printReport(report, stream.dropped())
+    print("classified {} of {} frames".format(classified[0], detector.checked))
 
-    cap.release()
-    cv2.destroyAllWindows()
+    if not headless:
+        cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
@@ -132,8 +141,36 @@ if __name__ == "__main__":
                         default="simple",
                         choices=MODEL_DICT.keys(),
                         help='model type')
+    parser.add_argument("-source",
+                        default="0",
+                        help='camera index, video file or "synthetic"')
+    parser.add_argument("-headless",
+                        action="store_true",
+                        help='do not show the video')
+    parser.add_argument("-frames",
+                        type=int,
+                        default=None,
+                        help='stop after this many classified frames')
+    parser.add_argument("-precision",
+                        default="float32",
+                        choices=PRECISIONS,
+                        help='run a reduced-precision model written by models.py')
+    parser.add_argument("-server",
+                        default=None,
+                        help='classify on a running inference_server.py at this address')
+    parser.add_argument("-smoothing",
+                        default="majority",
+                        choices=temporal.SMOOTHING,
+                        help='how the published gesture follows the classifications')
+    parser.add_argument("-threshold",
+                        type=float,
+                        default=4.0,
+                        help='mean pixel change below which a frame is not classified again, 0 to classify all')
     arguments = parser.parse_args()
 
-    # classification
+    # classification, restarted when the camera drops out
     while(1):
-        classify(arguments.model_type)
+        classify(arguments.model_type, arguments.source, arguments.headless, arguments.frames, arguments.precision, arguments.server,
+                 arguments.smoothing, arguments.threshold)
+        if not arguments.source.isdigit() or arguments.frames is not None:
+            break
@@ -1,19 +1,50 @@
-import redis
-from flask import Flask, jsonify, Response
+import json
+from flask import Flask, jsonify, Response, stream_with_context
 from flask_cors import CORS
 
-r = redis.StrictRedis(host='localhost', port=6379, db=0, charset='utf-8', decode_responses=True)
+import gestures
+
+channel = gestures.connect()
 
 app = Flask(__name__)
 CORS(app)
 
+# seconds between keep-alive comments on an idle event stream
+KEEPALIVE = 15.0
+
 @app.route('/get', methods=['GET'])
 def hello():
-    rtv = {'hand': str(r.get('foo'))}
-    print(rtv)
+    last = channel.latest()
+    rtv = {'hand': str(json.loads(last)['hand'] if last else None)}
     return jsonify(rtv)
     #return Response(jsonify(rtv), mimetype='application/json')
 
 
+@app.route('/events', methods=['GET'])
+def events():
+    """
+    Server-sent events: the last gesture, then every change as it is
+    published
+    """
+    subscription = channel.subscribe()
+
+    def stream():
+        try:
+            last = channel.latest()
+            if last:
+                yield 'data: {}\n\n'.format(last)
+            while True:
+                message = subscription.get(timeout=KEEPALIVE)
+                if message is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield 'data: {}\n\n'.format(message)
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 if __name__ == '__main__':
-    app.run(port=9998, debug=False)
+    app.run(port=9998, debug=False, threaded=True)
@@ -0,0 +1,338 @@
+"""
+Camera frames shared between processes without copying them through a
+pipe.
+
+    python framering.py -source 0 -name rps-frames
+    python classification.py -type vgg -source ring:rps-frames
+
+The capture process writes every frame into the next slot of a ring of
+fixed-size frames in shared memory; any number of processes attach to it
+by name and read the newest frame as a NumPy view of its slot. Each slot
+carries the sequence number of the frame in it, set to -1 while the
+frame is being written, so a reader can tell whether the frame it holds
+has been overwritten since (valid). RingSource hands the views to the
+pipeline uncopied, with a check the pipeline runs once the frame has
+been cropped and resized, dropping it if the writer has come round to
+its slot in the meantime.
+
+    python framering.py -bench
+
+compares passing synthetic frames to another process through the ring
+and through a multiprocessing.Queue.
+"""
+
+import argparse
+import functools
+import time
+
+import numpy as np
+from multiprocessing import shared_memory
+
+MAGIC = 0x52505346  # "RPSF"
+
+# header fields, int64 each
+H_MAGIC, H_WRITE, H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS, H_CLOSED = range(7)
+HEADER = 8
+
+# how long a waiting reader sleeps between looks at the write index
+POLL = 0.0005
+
+
+def attach(name):
+    """
+    Opens an existing segment without letting this process's resource
+    tracker delete it when this process exits
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13 attaching registers the segment too; a forked
+        # reader shares the writer's tracker, so keep it from registering
+        # rather than unregistering afterwards
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class FrameRing(object):
+    """
+    slots frames of shape uint8 pixels in one shared memory segment:
+
+        header | sequence number per slot | capture time per slot | frames
+
+    FrameRing.create makes the segment (the writer), FrameRing(name)
+    attaches to it (a reader)
+    """
+
+    def __init__(self, name, shm=None):
+        self.owner = shm is not None
+        self.shm   = attach(name) if shm is None else shm
+        self.header = np.ndarray(HEADER, dtype=np.int64, buffer=self.shm.buf)
+        if self.header[H_MAGIC] != MAGIC:
+            raise ValueError("{} is not a frame ring".format(name))
+        self.name   = self.shm.name
+        self.nslots = int(self.header[H_SLOTS])
+        self.shape  = tuple(int(n) for n in self.header[H_HEIGHT:H_CHANNELS + 1])
+        offset = 8 * HEADER
+        self.seqs  = np.ndarray(self.nslots, dtype=np.int64, buffer=self.shm.buf, offset=offset)
+        offset += 8 * self.nslots
+        self.times = np.ndarray(self.nslots, dtype=np.float64, buffer=self.shm.buf, offset=offset)
+        offset += 8 * self.nslots
+        self.frames = np.ndarray((self.nslots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=FrameRing.align(offset))
+        # the last frame this process read or wrote, and the frames it
+        # skipped reading because newer ones had arrived
+        self.seq     = 0
+        self.skipped = 0
+
+    @staticmethod
+    def align(offset):
+        return (offset + 63) // 64 * 64
+
+    @staticmethod
+    def create(shape, slots=8, name=None):
+        size = FrameRing.align(8 * (HEADER + 2 * slots)) + slots * int(np.prod(shape))
+        shm  = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray(HEADER, dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[H_SLOTS] = slots
+        header[H_HEIGHT:H_CHANNELS + 1] = shape
+        header[H_MAGIC] = MAGIC
+        ring = FrameRing(shm.name, shm)
+        ring.seqs[:] = 0
+        return ring
+
+    # writer
+
+    def begin(self):
+        """
+        The slot the next frame goes into, to write or capture into
+        directly; commit publishes it
+        """
+        seq  = int(self.header[H_WRITE]) + 1
+        slot = seq % self.nslots
+        self.seqs[slot] = -1
+        return self.frames[slot]
+
+    def commit(self, captured=None):
+        seq  = int(self.header[H_WRITE]) + 1
+        slot = seq % self.nslots
+        self.times[slot] = time.time() if captured is None else captured
+        self.seqs[slot]  = seq
+        self.header[H_WRITE] = seq
+        self.seq = seq
+        return seq
+
+    def write(self, frame, captured=None):
+        np.copyto(self.begin(), frame)
+        return self.commit(captured)
+
+    def close_writer(self):
+        self.header[H_CLOSED] = 1
+
+    # reader
+
+    def closed(self):
+        return bool(self.header[H_CLOSED])
+
+    def valid(self, seq):
+        """
+        Whether frame seq is still whole in its slot
+        """
+        return self.seqs[seq % self.nslots] == seq
+
+    def read(self, timeout=None):
+        """
+        Waits for a frame newer than the last one read and returns the
+        newest as (seq, view of its slot, capture time), or None after
+        timeout seconds or once the writer has closed
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            seq = int(self.header[H_WRITE])
+            if seq > self.seq:
+                slot = seq % self.nslots
+                captured = float(self.times[slot])
+                if self.seqs[slot] == seq:
+                    self.skipped += seq - self.seq - 1
+                    self.seq = seq
+                    return seq, self.frames[slot], captured
+                continue
+            if self.closed() or (deadline is not None and time.time() > deadline):
+                return None
+            time.sleep(POLL)
+
+    def close(self):
+        # the views have to go before the segment can be closed
+        self.header = self.seqs = self.times = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # frames still held elsewhere; the mapping goes with the process
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingSource(object):
+    """
+    A pipeline source reading the newest frames of a ring another
+    process captures into. read returns a view of the frame's slot, or
+    copies it into out if given; check, called right after read, returns
+    whether that frame is still whole in its slot
+    """
+
+    def __init__(self, name, timeout=5.0):
+        self.ring     = FrameRing(name)
+        self.timeout  = timeout
+        self.seq      = None
+        self.captured = None
+
+    def read(self, out=None):
+        item = self.ring.read(self.timeout)
+        if item is None:
+            return False, None
+        self.seq, view, self.captured = item
+        if out is None:
+            return True, view
+        np.copyto(out, view)
+        return True, out
+
+    def check(self):
+        return functools.partial(self.ring.valid, self.seq)
+
+    def release(self):
+        print("Read {} frames from ring {}, skipped {}".format(self.ring.seq, self.ring.name, self.ring.skipped))
+        self.ring.close()
+
+
+def produce(source, name=None, slots=8, max_frames=None):
+    """
+    Captures frames from a pipeline source into a new ring until the
+    source ends. After the first frame the source reads straight into
+    the slots
+    """
+    ok, frame = source.read()
+    if not ok:
+        raise IOError("no frame from the source")
+    ring = FrameRing.create(frame.shape, slots, name)
+    print("Capturing {} frames into ring {}".format("x".join(str(n) for n in frame.shape), ring.name))
+    ring.write(frame)
+    count = 1
+    try:
+        while max_frames is None or count < max_frames:
+            slot = ring.begin()
+            ok, frame = source.read(slot)
+            if not ok:
+                break
+            if not np.shares_memory(frame, slot):
+                np.copyto(slot, frame)
+            ring.commit()
+            count += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close_writer()
+        source.release()
+        # give the readers a moment to see the ring close
+        time.sleep(0.1)
+        ring.close()
+    return count
+
+
+def consume_ring(name, frames, result):
+    # what the pipeline does: preprocess the view, then check it is whole
+    from preprocess import Preprocessor
+    source = RingSource(name)
+    preprocessor = Preprocessor(64, 64)
+    latency, torn = [], 0
+    while len(latency) + torn < frames:
+        ok, frame = source.read()
+        if not ok:
+            break
+        check = source.check()
+        preprocessor.release(preprocessor(frame))
+        if not check():
+            torn += 1
+            continue
+        latency.append(time.time() - source.captured)
+    result.put((len(latency), source.ring.skipped, torn, latency))
+    source.ring.close()
+
+
+def consume_queue(frames_queue, frames, result):
+    from preprocess import Preprocessor
+    preprocessor = Preprocessor(64, 64)
+    latency = []
+    while len(latency) < frames:
+        frame, captured = frames_queue.get()
+        preprocessor.release(preprocessor(frame))
+        latency.append(time.time() - captured)
+    result.put((len(latency), 0, 0, latency))
+
+
+def bench(frames=300, shape=(720, 1280, 3), slots=8, interval=0.005):
+    """
+    Sends frames synthetic frames, one every interval seconds, to a reader
+    process through a ring and through a queue. Reports the writer's time
+    per frame and the latency until the reader has preprocessed the frame
+    as the pipeline does, with the frames it had to drop as torn
+    """
+    import multiprocessing
+    import pipeline
+    source = pipeline.SyntheticSource(shape=shape, fps=0, distinct=4)
+    result = multiprocessing.Queue()
+
+    ring   = FrameRing.create(shape, slots)
+    frames_queue = multiprocessing.Queue(maxsize=slots)
+    for name, target, send in (("ring", consume_ring, lambda frame: ring.write(frame)),
+                               ("queue", consume_queue, lambda frame: frames_queue.put((frame, time.time())))):
+        reader = multiprocessing.Process(target=target, args=(ring.name if name == "ring" else frames_queue, frames, result))
+        reader.start()
+        time.sleep(0.5)
+        spent = []
+        # a few extra frames in case the reader skips some
+        for _ in range(frames + 2 * slots):
+            if not reader.is_alive():
+                break
+            start = time.time()
+            send(source.read()[1])
+            spent.append(time.time() - start)
+            time.sleep(max(interval - spent[-1], 0))
+        read, skipped, torn, latency = result.get()
+        reader.join()
+        print("{:<6} {} frames read, {} skipped, {} torn, writer {:.3f}ms per frame, latency p50 {:.3f}ms p95 {:.3f}ms".format(
+            name, read, skipped, torn, 1000 * np.mean(spent), 1000 * np.percentile(latency, 50), 1000 * np.percentile(latency, 95)))
+    ring.close_writer()
+    ring.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Capture frames into shared memory")
+    parser.add_argument("-source",
+                        default="0",
+                        help='camera index, video file or "synthetic"')
+    parser.add_argument("-name",
+                        default="rps-frames",
+                        help='name of the shared memory ring')
+    parser.add_argument("-slots",
+                        type=int,
+                        default=8,
+                        help='frames in the ring')
+    parser.add_argument("-frames",
+                        type=int,
+                        default=None,
+                        help='stop after this many frames')
+    parser.add_argument("-bench",
+                        action="store_true",
+                        help='compare the ring with a multiprocessing.Queue')
+    arguments = parser.parse_args()
+
+    if arguments.bench:
+        bench()
+    else:
+        import pipeline
+        produce(pipeline.openSource(arguments.source, nframes=arguments.frames), arguments.name, arguments.slots, arguments.frames)
@@ -0,0 +1,152 @@
+"""
+Push channel for the classified hand gestures.
+
+The classifiers publish a gesture event whenever the gesture changes;
+flask_server.py streams the events to the front-end (/events) as they
+arrive. Events go through Redis pub/sub, or through an in-process stand-in
+when Redis is not available (then publisher and server have to share a
+process).
+"""
+
+import json
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CHANNEL    = "gestures"
+LAST_KEY   = "gestures:last"
+# the key the front-end's old /get polling read
+LEGACY_KEY = "foo"
+
+class LocalSubscription(object):
+
+    def __init__(self, channel):
+        self.channel  = channel
+        self.messages = []
+        self.ready    = threading.Condition(channel.lock)
+
+    def get(self, timeout=None):
+        """
+        Returns the next message, or None after timeout seconds
+        """
+        with self.ready:
+            if not self.messages:
+                self.ready.wait(timeout)
+            return self.messages.pop(0) if self.messages else None
+
+    def close(self):
+        with self.channel.lock:
+            if self in self.channel.subscribers:
+                self.channel.subscribers.remove(self)
+
+class LocalChannel(object):
+    """
+    In-process stand-in for the Redis channel
+    """
+
+    def __init__(self):
+        self.lock        = threading.Lock()
+        self.subscribers = []
+        self.last        = None
+
+    def publish(self, message, hand=None):
+        with self.lock:
+            self.last = message
+            for s in self.subscribers:
+                s.messages.append(message)
+                s.ready.notify()
+
+    def latest(self):
+        return self.last
+
+    def subscribe(self):
+        s = LocalSubscription(self)
+        with self.lock:
+            self.subscribers.append(s)
+        return s
+
+class RedisSubscription(object):
+
+    def __init__(self, client):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(CHANNEL)
+
+    def get(self, timeout=None):
+        message = self.pubsub.get_message(timeout=timeout)
+        return None if message is None else message["data"]
+
+    def close(self):
+        self.pubsub.close()
+
+class RedisChannel(object):
+    """
+    Events are published on the gestures channel; the last one is also
+    kept under gestures:last for clients that connect later, and the bare
+    gesture under the legacy key
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def publish(self, message, hand=None):
+        pipe = self.client.pipeline()
+        pipe.set(LAST_KEY, message)
+        if hand is not None:
+            pipe.set(LEGACY_KEY, hand)
+        pipe.publish(CHANNEL, message)
+        pipe.execute()
+
+    def latest(self):
+        return self.client.get(LAST_KEY)
+
+    def subscribe(self):
+        return RedisSubscription(self.client)
+
+def connect(host='localhost', port=6379):
+    """
+    Returns a RedisChannel when Redis answers, else a LocalChannel
+    """
+    if redis is not None:
+        client = redis.StrictRedis(host=host, port=port, db=0, charset='utf-8', decode_responses=True)
+        try:
+            client.ping()
+            return RedisChannel(client)
+        except redis.exceptions.ConnectionError as e:
+            print("Redis not available ({}), using an in-process gesture channel".format(e))
+    else:
+        print("redis not installed, using an in-process gesture channel")
+    return LocalChannel()
+
+class GesturePublisher(object):
+    """
+    Publishes a gesture event, {"hand", "confidence", "time", "seq"}, each
+    time the classified gesture changes. With several stations on one
+    channel each names its stream, which is added to its events (and
+    leaves the legacy key alone)
+    """
+
+    def __init__(self, channel=None, stream=None):
+        self.channel = connect() if channel is None else channel
+        self.stream  = stream
+        self.hand    = None
+        self.seq     = 0
+
+    def publish(self, hand, confidence=None):
+        """
+        Publishes hand if it differs from the last one. Returns whether
+        an event was sent
+        """
+        if hand == self.hand:
+            return False
+        self.hand = hand
+        self.seq += 1
+        event = {"hand": hand, "confidence": None if confidence is None else float(confidence),
+                 "time": time.time(), "seq": self.seq}
+        if self.stream is not None:
+            event["stream"] = self.stream
+        self.channel.publish(json.dumps(event), hand if self.stream is None else None)
+        return True
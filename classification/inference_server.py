@@ -0,0 +1,370 @@
+"""
+One inference process for many game stations.
+
+    python inference_server.py -type vgg
+    python classification.py -type vgg -server /tmp/rps-inference.sock
+
+The server loads the model once and listens on a Unix socket (or
+host:port). Every station connects as a named stream and sends its
+preprocessed hand crops; the server collects the crops that arrive within
+-delay milliseconds of each other, up to -batch of them, classifies them
+with one predict call and sends every stream its own result. The
+stations smooth and publish their own gestures, tagged with their
+stream name; the server publishes nothing.
+
+    python inference_server.py -bench 4 -frames 500
+
+runs 4 synthetic stations against a running server and reports their
+throughput and round-trip latency.
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+import pipeline
+from utils import MODEL_DICT
+
+ADDRESS = "/tmp/rps-inference.sock"
+
+# request: sequence number, height, width; then height x width x 3 float32
+REQUEST = struct.Struct("!IHH")
+# reply: sequence number; then one float32 per label
+REPLY   = struct.Struct("!I")
+LENGTH  = struct.Struct("!I")
+
+
+def listen(address):
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, int(port)))
+    else:
+        if os.path.exists(address):
+            os.remove(address)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(address)
+    server.listen(64)
+    return server
+
+
+def connect(address):
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        client = socket.create_connection((host, int(port)))
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    else:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(address)
+    return client
+
+
+def recv_into(sock, buffer):
+    """
+    Fills buffer from sock. Returns False if the peer closed first
+    """
+    view = memoryview(buffer).cast("B")
+    while len(view):
+        n = sock.recv_into(view)
+        if n == 0:
+            return False
+        view = view[n:]
+    return True
+
+
+def send_message(sock, data):
+    sock.sendall(LENGTH.pack(len(data)) + data)
+
+
+def recv_message(sock):
+    header = bytearray(LENGTH.size)
+    if not recv_into(sock, header):
+        return None
+    data = bytearray(LENGTH.unpack(header)[0])
+    return bytes(data) if recv_into(sock, data) else None
+
+
+class Request(object):
+
+    def __init__(self, stream, seq, data):
+        self.stream   = stream
+        self.seq      = seq
+        self.data     = data
+        self.received = time.time()
+
+
+class Stream(object):
+    """
+    A connected station: its socket and the buffer its crops are read
+    into
+    """
+
+    def __init__(self, name, sock, shape):
+        self.name      = name
+        self.sock      = sock
+        self.data      = np.empty(shape, dtype=np.float32)
+        self.lock      = threading.Lock()
+
+    def reply(self, seq, classification):
+        with self.lock:
+            self.sock.sendall(REPLY.pack(seq) + np.asarray(classification, dtype=np.float32).tobytes())
+
+
+class InferenceServer(object):
+    """
+    Reads crops from every connected stream and classifies them in
+    batches. A batch is sent to the model as soon as max_batch crops or
+    one from every stream are waiting, or max_delay seconds after its
+    first crop arrived
+    """
+
+    def __init__(self, classifier, address=ADDRESS, max_batch=16, max_delay=0.005):
+        self.classifier = classifier
+        self.address    = address
+        self.max_batch  = max_batch
+        self.max_delay  = max_delay
+        self.shape      = (classifier.height, classifier.width, 3)
+        self.batch      = np.zeros((max_batch,) + self.shape, dtype=np.float32)
+        self.requests   = queue.Queue()
+        self.timer      = pipeline.StageTimer()
+        self.sizes      = np.zeros(max_batch + 1, dtype=int)
+        self.connected  = 0
+        self.lock       = threading.Lock()
+        self.running    = False
+        self.server     = None
+
+    def hello(self):
+        return json.dumps({"model_type": self.classifier.model_type, "width": self.classifier.width,
+                           "height": self.classifier.height, "labels": list(self.classifier.labels)}).encode("utf-8")
+
+    def __serve(self, sock):
+        try:
+            send_message(sock, self.hello())
+            name = recv_message(sock)
+            if name is None:
+                return
+            name = name.decode("utf-8")
+            stream = Stream(name, sock, self.shape)
+            print("Stream {} connected".format(name))
+            with self.lock:
+                self.connected += 1
+            try:
+                header = bytearray(REQUEST.size)
+                while self.running and recv_into(sock, header):
+                    seq, height, width = REQUEST.unpack(header)
+                    if (height, width, 3) != self.shape:
+                        print("Stream {} sent {}x{} crops, expected {}x{}".format(name, height, width, self.shape[0], self.shape[1]))
+                        break
+                    if not recv_into(sock, stream.data):
+                        break
+                    # the station waits for the reply, so its buffer is free
+                    # again by the time it sends the next crop
+                    self.requests.put(Request(stream, seq, stream.data))
+            finally:
+                with self.lock:
+                    self.connected -= 1
+            print("Stream {} disconnected".format(name))
+        except (socket.error, ValueError) as e:
+            print("Stream error: {}".format(e))
+        finally:
+            sock.close()
+
+    def __accept(self):
+        while self.running:
+            try:
+                sock, _ = self.server.accept()
+            except socket.error:
+                break
+            t = threading.Thread(target=self.__serve, args=(sock,))
+            t.daemon = True
+            t.start()
+
+    def collect(self):
+        """
+        Waits for a first request, then for more until the batch is full,
+        every connected stream is in it (each waits for its reply before
+        sending again) or its deadline has passed
+        """
+        try:
+            requests = [self.requests.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = requests[0].received + self.max_delay
+        while len(requests) < min(self.max_batch, self.connected):
+            try:
+                requests.append(self.requests.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                requests.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return requests
+
+    def step(self):
+        requests = self.collect()
+        if not requests:
+            return 0
+        n = len(requests)
+        for i, r in enumerate(requests):
+            np.copyto(self.batch[i], r.data)
+        start = time.time()
+        classifications = self.classifier.predict(self.batch[:n])
+        now = time.time()
+        self.timer.add("inference", now - start)
+        self.sizes[n] += 1
+        for r, classification in zip(requests, classifications):
+            try:
+                r.stream.reply(r.seq, classification)
+            except socket.error:
+                continue
+            self.timer.add("latency", time.time() - r.received)
+        return n
+
+    def start(self):
+        self.running = True
+        self.server  = listen(self.address)
+        t = threading.Thread(target=self.__accept)
+        t.daemon = True
+        t.start()
+        print("Serving {} on {}".format(self.classifier.model_type, self.address))
+
+    def stop(self):
+        self.running = False
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def run(self):
+        self.start()
+        try:
+            while self.running:
+                self.step()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            self.report()
+
+    def report(self):
+        pipeline.printReport(self.timer.report())
+        batches = self.sizes.sum()
+        if batches:
+            print("{} batches, mean size {:.2f}, sizes {}".format(
+                batches, np.dot(np.arange(len(self.sizes)), self.sizes) / float(batches),
+                dict((n, int(c)) for n, c in enumerate(self.sizes) if c)))
+
+
+class InferenceClient(object):
+    """
+    A station's connection to the server. predict has the signature of
+    Classifier.predict, for a batch of one crop
+    """
+
+    def __init__(self, stream, address=ADDRESS):
+        self.sock   = connect(address)
+        hello       = json.loads(recv_message(self.sock).decode("utf-8"))
+        self.model_type = hello["model_type"]
+        self.width  = hello["width"]
+        self.height = hello["height"]
+        self.labels = hello["labels"]
+        self.reply  = np.empty(len(self.labels), dtype=np.float32)
+        self.header = bytearray(REPLY.size)
+        self.seq    = 0
+        send_message(self.sock, str(stream).encode("utf-8"))
+
+    def predict(self, data):
+        data = np.ascontiguousarray(data, dtype=np.float32).reshape(self.height, self.width, 3)
+        self.seq += 1
+        self.sock.sendall(REQUEST.pack(self.seq, self.height, self.width))
+        self.sock.sendall(memoryview(data).cast("B"))
+        if not (recv_into(self.sock, self.header) and recv_into(self.sock, self.reply)):
+            raise IOError("inference server closed the connection")
+        return self.reply[np.newaxis].copy()
+
+    def close(self):
+        self.sock.close()
+
+
+def station(stream, address, frames, result):
+    """
+    A synthetic station for the benchmark: sends frames random crops one
+    after the other
+    """
+    client  = InferenceClient(stream, address)
+    crops   = np.random.RandomState(abs(hash(stream)) % 2**31).uniform(size=(8, client.height, client.width, 3)).astype(np.float32)
+    latency = np.zeros(frames)
+    start   = time.time()
+    for i in range(frames):
+        sent = time.time()
+        client.predict(crops[i % len(crops)])
+        latency[i] = time.time() - sent
+    result.put((stream, time.time() - start, latency))
+    client.close()
+
+
+def bench(nstations, frames, address):
+    import multiprocessing
+    result  = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=station, args=("station{}".format(i), address, frames, result))
+               for i in range(nstations)]
+    start = time.time()
+    for w in workers:
+        w.start()
+    results = [result.get() for _ in workers]
+    elapsed = time.time() - start
+    for w in workers:
+        w.join()
+    latency = 1000.0 * np.concatenate([r[2] for r in results])
+    print("{} stations, {} frames: {:.1f} frames/s in total, {:.1f} per station, latency p50 {:.2f}ms p95 {:.2f}ms".format(
+        nstations, len(latency), len(latency) / elapsed, np.mean([frames / r[1] for r in results]),
+        np.percentile(latency, 50), np.percentile(latency, 95)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched gesture classification for several stations")
+    parser.add_argument("-type",
+                        dest="model_type",
+                        action="store",
+                        default="simple",
+                        choices=MODEL_DICT.keys(),
+                        help='model type')
+    parser.add_argument("-address",
+                        default=ADDRESS,
+                        help='Unix socket path or host:port')
+    parser.add_argument("-batch",
+                        type=int,
+                        default=16,
+                        help='largest batch')
+    parser.add_argument("-delay",
+                        type=float,
+                        default=5.0,
+                        help='milliseconds a crop may wait for others to batch with')
+    parser.add_argument("-bench",
+                        type=int,
+                        default=0,
+                        help='run this many synthetic stations against a running server')
+    parser.add_argument("-frames",
+                        type=int,
+                        default=500,
+                        help='frames per benchmark station')
+    arguments = parser.parse_args()
+
+    if arguments.bench:
+        bench(arguments.bench, arguments.frames, arguments.address)
+    else:
+        import models
+        classifier = models.REGISTRY.get(arguments.model_type)
+        InferenceServer(classifier, arguments.address, arguments.batch, arguments.delay / 1000.0).run()
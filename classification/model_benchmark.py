@@ -0,0 +1,112 @@
+"""
+python model_benchmark.py -type vgg
+python model_benchmark.py -type mobilenet -frames 500 -o mobilenet.json
+
+Per-frame latency and accuracy of the ways a model can run: the backbone
+and head as two predict calls, the fused model, and the float16 and int8
+TensorFlow Lite variants when they have been written (models.py
+-precision). Accuracy is measured on the validation images; agreement is
+the share of frames classified like the two-stage path does. Without
+validation images the frames are random and only agreement is reported.
+"""
+
+import argparse
+import collections
+import json
+import os
+import time
+
+import numpy as np
+
+os.environ['KERAS_BACKEND'] = 'tensorflow'
+
+import models
+from utils import MODEL_DICT
+
+
+def variants(model_type):
+    yield 'two-stage', models.two_stage
+    yield 'fused', lambda model_type: models.Classifier(model_type, models.fused(model_type))
+    for precision in models.PRECISIONS[1:]:
+        path = models.lite_file(model_type, precision)
+        if os.path.exists(path):
+            yield precision, lambda model_type, path=path: models.LiteClassifier(model_type, path)
+        else:
+            print('Skip {}, {} not found'.format(precision, path))
+
+
+def measure(classifier, images, warmup=10):
+    """
+    Classifies the images one at a time, as the capture loop does.
+    Returns the predicted label indices and the latency of every frame
+    """
+    for image in images[:warmup]:
+        classifier.predict(image[np.newaxis])
+    predicted = np.zeros(len(images), dtype=int)
+    latency   = np.zeros(len(images))
+    for i, image in enumerate(images):
+        start = time.time()
+        predicted[i] = np.argmax(classifier.predict(image[np.newaxis])[0])
+        latency[i]   = time.time() - start
+    return predicted, latency
+
+
+def benchmark(model_type, frames=200, image_dir=None, seed=0):
+    rng = np.random.RandomState(seed)
+    images, labels = models.load_images(model_type, image_dir)
+    if not len(images):
+        print('No validation images, classifying random frames')
+        images = rng.uniform(size=(frames, MODEL_DICT[model_type]['width'], MODEL_DICT[model_type]['height'], 3)).astype(np.float32)
+        labels = None
+    else:
+        # the images come sorted by class
+        order = rng.permutation(len(images))[:frames]
+        images, labels = images[order], labels[order]
+
+    results   = collections.OrderedDict()
+    reference = None
+    for name, load in variants(model_type):
+        start      = time.time()
+        classifier = load(model_type)
+        load_time  = time.time() - start
+        predicted, latency = measure(classifier, images)
+        if reference is None:
+            reference = predicted
+        ms = 1000.0 * latency
+        results[name] = {"load_s": load_time, "frames": len(images),
+                         "mean_ms": float(ms.mean()), "p50_ms": float(np.percentile(ms, 50)),
+                         "p95_ms": float(np.percentile(ms, 95)),
+                         "accuracy": None if labels is None else float(np.mean(predicted == labels)),
+                         "agreement": float(np.mean(predicted == reference))}
+        r = results[name]
+        print("{:<10} load {:6.1f}s  mean {:7.2f}ms  p50 {:7.2f}ms  p95 {:7.2f}ms  accuracy {}  agreement {:.3f}".format(
+            name, r["load_s"], r["mean_ms"], r["p50_ms"], r["p95_ms"],
+            "-" if r["accuracy"] is None else "{:.3f}".format(r["accuracy"]), r["agreement"]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two-stage, fused and reduced-precision inference")
+    parser.add_argument("-type",
+                        dest="model_type",
+                        action="store",
+                        default="vgg",
+                        choices=[k for k in MODEL_DICT if 'fused_file' in MODEL_DICT[k]],
+                        help='model type')
+    parser.add_argument("-frames",
+                        type=int,
+                        default=200,
+                        help='frames to classify per variant')
+    parser.add_argument("-images",
+                        default=None,
+                        help='validation image folder, with p, r and s subfolders')
+    parser.add_argument("-o",
+                        dest="path",
+                        default=None,
+                        help='write the results as JSON')
+    arguments = parser.parse_args()
+
+    results = benchmark(arguments.model_type, arguments.frames, arguments.images)
+    if arguments.path:
+        with open(arguments.path, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,282 @@
+"""
+Loads the classifiers of MODEL_DICT once per process and keeps them
+resident, warmed up with one inference, so restarting the capture loop
+does not reload any weights.
+
+    python models.py -type vgg
+    python models.py -type vgg -precision int8
+
+writes the backbone and the trained head as one fused model
+(MODEL_DICT[...]['fused_file']), which then loads from a single file
+instead of building the backbone and fetching the ImageNet weights; with
+-precision float16 or int8 also a reduced-precision TensorFlow Lite
+variant of it for the CPU. Without a fused file the two are still chained
+into one graph in memory, so every frame is a single predict call.
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+os.environ['KERAS_BACKEND'] = 'tensorflow'
+
+from keras import backend as K
+from keras.models import load_model, Model
+from keras.applications import VGG16, MobileNet
+
+from utils import MODEL_DICT, PRECISIONS, resize_from_array
+
+HAND_TYPE_STRING_LIST = ['paper', 'rock', 'scissors']
+
+
+def predictor(model):
+    """
+    Returns model.predict for use on any thread. Keras on TensorFlow 1
+    binds a model to the graph of the thread that loaded it
+    """
+    if hasattr(model, '_make_predict_function'):
+        model._make_predict_function()
+    try:
+        graph = K.get_session().graph
+    except Exception:
+        graph = None
+
+    def predict(data):
+        if graph is None:
+            return model.predict(data, batch_size=len(data), verbose=0)
+        with graph.as_default():
+            return model.predict(data, batch_size=len(data), verbose=0)
+    return predict
+
+
+def custom_objects():
+    """
+    The layers Keras needs to be told about to load a MobileNet
+    """
+    try:
+        from keras.applications import mobilenet
+        return {'relu6': mobilenet.relu6, 'DepthwiseConv2D': mobilenet.DepthwiseConv2D}
+    except (ImportError, AttributeError):
+        return {}
+
+
+def backbone(model_type):
+    width = MODEL_DICT[model_type]['width']
+    height = MODEL_DICT[model_type]['height']
+    if model_type == 'vgg':
+        return VGG16(include_top=False, weights='imagenet', input_shape=(width, height, 3))
+    if model_type == 'mobilenet':
+        return MobileNet(include_top=False, weights='imagenet', alpha=0.25, input_shape=(width, height, 3))
+    return None
+
+
+class Classifier(object):
+    """
+    A loaded model: one fused model, or a separate backbone and head
+    (two predict calls per frame). predict takes a batch of scaled images
+    and returns the class probabilities over labels
+    """
+
+    def __init__(self, model_type, head, backbone=None):
+        self.model_type = model_type
+        self.width      = MODEL_DICT[model_type]['width']
+        self.height     = MODEL_DICT[model_type]['height']
+        self.labels     = HAND_TYPE_STRING_LIST
+        self.head       = predictor(head)
+        self.backbone   = None if backbone is None else predictor(backbone)
+
+    def predict(self, data):
+        features = data if self.backbone is None else self.backbone(data)
+        return self.probabilities(self.head(features))
+
+    def probabilities(self, classification):
+        if self.model_type == 'mobilenet':
+            #classification[:, 0] *= 0.05  # inhibit nothing
+            classification = classification[:, 1:] / np.sum(classification[:, 1:], axis=1, keepdims=True)
+        return classification
+
+    def warm_up(self):
+        self.predict(np.zeros((1, self.width, self.height, 3), dtype=np.float32))
+
+
+class LiteClassifier(Classifier):
+    """
+    A fused model converted to TensorFlow Lite (see quantize), run one
+    image at a time by the Lite interpreter
+    """
+
+    def __init__(self, model_type, path):
+        import tensorflow as tf
+        self.model_type  = model_type
+        self.width       = MODEL_DICT[model_type]['width']
+        self.height      = MODEL_DICT[model_type]['height']
+        self.labels      = HAND_TYPE_STRING_LIST
+        self.lock        = threading.Lock()
+        self.interpreter = tf.lite.Interpreter(model_path=path)
+        self.interpreter.allocate_tensors()
+        self.input       = self.interpreter.get_input_details()[0]
+        self.output      = self.interpreter.get_output_details()[0]
+
+    def invoke(self, image):
+        self.interpreter.set_tensor(self.input['index'], image[np.newaxis].astype(self.input['dtype']))
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output['index'])[0]
+
+    def predict(self, data):
+        with self.lock:
+            classification = np.array([self.invoke(image) for image in data], dtype=np.float32)
+        return self.probabilities(classification)
+
+
+class ModelRegistry(object):
+    """
+    Thread-safe cache of Classifiers, one per model type
+    """
+
+    def __init__(self):
+        self.lock   = threading.Lock()
+        self.models = {}
+
+    def get(self, model_type, precision='float32'):
+        with self.lock:
+            if (model_type, precision) not in self.models:
+                self.models[model_type, precision] = self.load(model_type, precision)
+            return self.models[model_type, precision]
+
+    def load(self, model_type, precision='float32'):
+        start = time.time()
+        fused_file = MODEL_DICT[model_type].get('fused_file')
+        if precision != 'float32':
+            path = lite_file(model_type, precision)
+            if not os.path.exists(path):
+                raise IOError('{} not found, run python models.py -type {} -precision {}'.format(path, model_type, precision))
+            print('Load {} model {}'.format(precision, path))
+            classifier = LiteClassifier(model_type, path)
+        elif fused_file is not None and os.path.exists(fused_file):
+            print('Load fused model {}'.format(fused_file))
+            classifier = Classifier(model_type, load_model(fused_file, custom_objects=custom_objects()))
+        else:
+            classifier = Classifier(model_type, fused(model_type))
+        loaded = time.time()
+        classifier.warm_up()
+        print('Loaded {} model in {:.1f}s, warm-up {:.0f}ms'.format(model_type, loaded - start, 1000 * (time.time() - loaded)))
+        return classifier
+
+
+REGISTRY = ModelRegistry()
+
+
+def fused(model_type):
+    """
+    The backbone and the trained head chained into one model; the head
+    alone for the simple CNN
+    """
+    head = load_model(MODEL_DICT[model_type]['model_file'])
+    base = backbone(model_type)
+    if base is None:
+        return head
+    return Model(inputs=base.input, outputs=head(base.output))
+
+
+def two_stage(model_type):
+    """
+    The backbone and the head as separate models, as classification.py
+    used to run them; kept to compare against
+    """
+    return Classifier(model_type, load_model(MODEL_DICT[model_type]['model_file']), backbone(model_type))
+
+
+def fuse(model_type, path=None):
+    """
+    Saves the fused model
+    """
+    path = path or MODEL_DICT[model_type]['fused_file']
+    fused(model_type).save(path)
+    print('Saved fused model {}'.format(path))
+    return path
+
+
+def lite_file(model_type, precision):
+    return os.path.splitext(MODEL_DICT[model_type]['fused_file'])[0] + '_{}.tflite'.format(precision)
+
+
+def load_images(model_type, image_dir=None, limit=None):
+    """
+    The scaled validation images under image_dir/{p,r,s} and their label
+    indices. Empty when there are none
+    """
+    from glob import glob
+    from PIL import Image
+    image_dir = image_dir or '{}/validation'.format(MODEL_DICT[model_type]['data_file'])
+    width  = MODEL_DICT[model_type]['width']
+    height = MODEL_DICT[model_type]['height']
+    images, labels = [], []
+    for label, folder in enumerate(['p', 'r', 's']):
+        for path in sorted(glob('{}/{}/*.png'.format(image_dir, folder)))[:limit]:
+            image = np.asarray(Image.open(path).convert('RGB'))
+            images.append(resize_from_array(image, width, height) / 255.0)
+            labels.append(label)
+    if not images:
+        return np.zeros((0, width, height, 3), dtype=np.float32), np.zeros(0, dtype=int)
+    return np.array(images, dtype=np.float32), np.array(labels)
+
+
+def quantize(model_type, precision, path=None, samples=100):
+    """
+    Converts the fused model to TensorFlow Lite. float16 halves the
+    weights; int8 quantizes weights and activations, calibrated on up to
+    samples validation images (random images when there are none)
+    """
+    import tensorflow as tf
+    path = path or lite_file(model_type, precision)
+    if hasattr(tf.lite.TFLiteConverter, 'from_keras_model'):
+        converter = tf.lite.TFLiteConverter.from_keras_model(fused(model_type))
+    else:
+        fused_file = MODEL_DICT[model_type]['fused_file']
+        if not os.path.exists(fused_file):
+            fuse(model_type, fused_file)
+        converter = tf.lite.TFLiteConverter.from_keras_model_file(fused_file, custom_objects=custom_objects())
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision == 'int8':
+        images, _ = load_images(model_type, limit=samples // 3 + 1)
+        if not len(images):
+            width  = MODEL_DICT[model_type]['width']
+            height = MODEL_DICT[model_type]['height']
+            images = np.random.RandomState(0).uniform(size=(samples, width, height, 3)).astype(np.float32)
+
+        def representative_dataset():
+            for image in images[:samples]:
+                yield [image[np.newaxis]]
+        converter.representative_dataset = representative_dataset
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    print('Saved {} model {}'.format(precision, path))
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fuse backbone and head into one model file")
+    parser.add_argument("-type",
+                        dest="model_type",
+                        action="store",
+                        default="vgg",
+                        choices=[k for k in MODEL_DICT if 'fused_file' in MODEL_DICT[k]],
+                        help='model type')
+    parser.add_argument("-precision",
+                        default="float32",
+                        choices=PRECISIONS,
+                        help='float16 and int8 write a TensorFlow Lite model')
+    parser.add_argument("-o",
+                        dest="path",
+                        default=None,
+                        help='output file')
+    arguments = parser.parse_args()
+    if arguments.precision == 'float32':
+        fuse(arguments.model_type, arguments.path)
+    else:
+        quantize(arguments.model_type, arguments.precision, arguments.path)
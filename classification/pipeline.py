@@ -0,0 +1,284 @@
+"""
+Pipelined capture and inference.
+
+A capture thread keeps only the newest camera frame, a preprocessing
+thread and an inference thread pass their work on through bounded queues
+that drop the oldest item when full, and the results are handed to the
+calling thread (display and publishing) off the critical path. Stale
+frames are skipped instead of queueing up, so the model always works on
+the most recent frame.
+
+Frames can come from a camera, a video file, a synthetic source or a
+capture process through shared memory (framering.py), so the pipeline
+runs without a webcam.
+"""
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+class CameraSource(object):
+    """
+    A cv2.VideoCapture (camera index or video file). With realtime=True a
+    file is read at its own frame rate, as a camera would deliver it.
+    read(out) captures into the array out where its shape allows
+    """
+
+    def __init__(self, device=0, realtime=False):
+        import cv2
+        self.capture  = cv2.VideoCapture(device)
+        self.realtime = realtime
+        fps = self.capture.get(cv2.CAP_PROP_FPS) if realtime else 0
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.next     = time.time()
+
+    def read(self, out=None):
+        if self.interval > 0:
+            delay = self.next - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.next = max(self.next, time.time() - self.interval) + self.interval
+        return self.capture.read(out)
+
+    def release(self):
+        self.capture.release()
+
+class SyntheticSource(object):
+    """
+    Random frames at fps (0 for as fast as possible), nframes of them or
+    forever
+    """
+
+    def __init__(self, shape=(720, 1280, 3), fps=30.0, nframes=None, seed=0, distinct=8):
+        rng = np.random.RandomState(seed)
+        self.frames   = [rng.randint(0, 256, size=shape).astype(np.uint8) for _ in range(distinct)]
+        self.interval = 1.0 / fps if fps else 0.0
+        self.nframes  = nframes
+        self.count    = 0
+        self.next     = time.time()
+
+    def read(self, out=None):
+        if self.nframes is not None and self.count >= self.nframes:
+            return False, None
+        if self.interval > 0:
+            delay = self.next - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.next = max(self.next, time.time() - self.interval) + self.interval
+        frame = self.frames[self.count % len(self.frames)]
+        self.count += 1
+        if out is not None:
+            np.copyto(out, frame)
+            return True, out
+        return True, frame
+
+    def release(self):
+        pass
+
+def openSource(source, fps=30.0, nframes=None, realtime=True):
+    """
+    "synthetic", "ring:NAME" (see framering.py), a camera index or a
+    video file name. Video files play at their own frame rate unless
+    realtime is False
+    """
+    if source == "synthetic":
+        return SyntheticSource(fps=fps, nframes=nframes)
+    if str(source).startswith("ring:"):
+        import framering
+        return framering.RingSource(source[len("ring:"):])
+    if str(source).isdigit():
+        return CameraSource(int(source))
+    return CameraSource(source, realtime=realtime)
+
+class DropOldestQueue(object):
+    """
+    A bounded queue whose put never blocks: when it is full the oldest
+    item is dropped, and passed to on_drop if given. get returns None
+    once the queue is closed and empty
+    """
+
+    def __init__(self, maxsize=1, on_drop=None):
+        self.items   = collections.deque(maxlen=maxsize)
+        self.ready   = threading.Condition()
+        self.closed  = False
+        self.dropped = 0
+        self.on_drop = on_drop
+
+    def put(self, item):
+        with self.ready:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop(self.items[0])
+            self.items.append(item)
+            self.ready.notify()
+
+    def offer(self, item):
+        """
+        Queues item only if there is room, never dropping another
+        """
+        with self.ready:
+            if len(self.items) == self.items.maxlen:
+                return False
+            self.items.append(item)
+            self.ready.notify()
+            return True
+
+    def get(self, timeout=None):
+        with self.ready:
+            while not self.items and not self.closed:
+                if not self.ready.wait(timeout):
+                    return None
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify_all()
+
+class StageTimer(object):
+    """
+    Thread-safe timings per stage, keeping the last window samples for
+    percentiles
+    """
+
+    def __init__(self, window=1000):
+        self.lock    = threading.Lock()
+        self.window  = window
+        self.samples = collections.OrderedDict()
+        self.counts  = {}
+        self.start   = time.time()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            if stage not in self.samples:
+                self.samples[stage] = collections.deque(maxlen=self.window)
+                self.counts[stage]  = 0
+            self.samples[stage].append(seconds)
+            self.counts[stage] += 1
+
+    def report(self):
+        with self.lock:
+            elapsed = time.time() - self.start
+            report  = collections.OrderedDict()
+            for stage, samples in self.samples.items():
+                ms = 1000.0 * np.array(samples)
+                report[stage] = {"count": self.counts[stage], "fps": self.counts[stage] / elapsed,
+                                 "mean_ms": float(ms.mean()), "p50_ms": float(np.percentile(ms, 50)),
+                                 "p95_ms": float(np.percentile(ms, 95)), "max_ms": float(ms.max())}
+            return report
+
+def printReport(report, dropped=None):
+    for stage, r in report.items():
+        print("{:<12} {:6d} frames {:7.1f} fps  mean {:7.2f}ms  p50 {:7.2f}ms  p95 {:7.2f}ms  max {:7.2f}ms".format(
+            stage, r["count"], r["fps"], r["mean_ms"], r["p50_ms"], r["p95_ms"], r["max_ms"]))
+    if dropped:
+        print("dropped " + ", ".join("{} {}".format(k, v) for k, v in dropped.items()))
+
+class Pipeline(object):
+    """
+    source -> capture thread -> preprocess(frame) -> infer(data) ->
+    output(frame, result) on the thread that calls run.
+
+    preprocess and infer run on their own threads; output is where display
+    and publishing go. The latency stage is the time from a frame being
+    captured until its result has been output. release, if given, gets
+    every preprocessed input that is dropped before infer sees it.
+    preprocess may return None for a frame that needs no inference; that
+    is only queued when there is room, so it never displaces a frame
+    that does
+    """
+
+    def __init__(self, source, preprocess, infer, output=None, queue_size=1, timer=None, release=None):
+        self.source     = source
+        self.preprocess = preprocess
+        self.infer      = infer
+        self.output     = output
+        self.timer      = StageTimer() if timer is None else timer
+        self.release    = release
+        self.frames     = DropOldestQueue(1)
+        self.inputs     = DropOldestQueue(queue_size, on_drop=None if release is None else lambda item: release(item[0]))
+        self.results    = DropOldestQueue(queue_size)
+        self.running    = False
+        self.torn       = 0
+
+    def stop(self):
+        self.running = False
+
+    def __capture(self):
+        try:
+            while self.running:
+                start = time.time()
+                ok, frame = self.source.read()
+                if not ok:
+                    break
+                # a source handing out views of shared memory (framering.py)
+                # says how to tell the view still holds this frame
+                check = self.source.check() if hasattr(self.source, "check") else None
+                now = time.time()
+                self.timer.add("capture", now - start)
+                self.frames.put((frame, now, check))
+        finally:
+            self.frames.close()
+
+    def __stage(self, name, function, inbox, outbox, check=False):
+        try:
+            while True:
+                item = inbox.get()
+                if item is None:
+                    break
+                start  = time.time()
+                result = function(item[0])
+                self.timer.add(name, time.time() - start)
+                if check and item[2] is not None and not item[2]():
+                    # the frame was overwritten while it was preprocessed
+                    self.torn += 1
+                    if self.release is not None:
+                        self.release(result)
+                    continue
+                if result is None:
+                    outbox.offer((result,) + item)
+                else:
+                    outbox.put((result,) + item)
+        finally:
+            outbox.close()
+
+    def run(self, max_frames=None):
+        """
+        Runs until the source ends, stop is called, output returns False
+        or max_frames results were output. Returns the timing report
+        """
+        self.running = True
+        threads = [threading.Thread(target=self.__capture),
+                   threading.Thread(target=self.__stage, args=("preprocess", self.preprocess, self.frames, self.inputs, True)),
+                   threading.Thread(target=self.__stage, args=("inference", self.infer, self.inputs, self.results))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        count = 0
+        try:
+            while self.running:
+                item = self.results.get(timeout=0.5)
+                if item is None:
+                    if self.results.closed:
+                        break
+                    continue
+                result, data, frame, captured = item[:4]
+                start = time.time()
+                keep_going = self.output is None or self.output(frame, result) is not False
+                now = time.time()
+                self.timer.add("output", now - start)
+                self.timer.add("latency", now - captured)
+                count += 1
+                if not keep_going or (max_frames is not None and count >= max_frames):
+                    break
+        finally:
+            self.running = False
+            self.source.release()
+        return self.timer.report()
+
+    def dropped(self):
+        return collections.OrderedDict([("frames", self.frames.dropped), ("inputs", self.inputs.dropped), ("results", self.results.dropped),
+                                        ("torn", self.torn)])
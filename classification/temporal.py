@@ -0,0 +1,111 @@
+"""
+Temporal filtering of the classified gestures.
+
+ChangeDetector decides, from a coarse grid of pixels of the capture
+region, whether a frame differs enough from the last classified one to
+be worth classifying again; while the hand holds still the previous
+classification is reused. Smoother turns the per-frame classifications
+into a stable gesture, so a single odd frame does not flip the gesture
+that gets published.
+"""
+
+import collections
+
+import numpy as np
+
+SMOOTHING = ["majority", "ema", "none"]
+
+
+class ChangeDetector(object):
+    """
+    Compares every step-th pixel of the crop, row and column (sample),
+    with the same pixels of the last crop that was classified. A crop
+    counts as changed when their mean absolute difference exceeds
+    threshold (in pixel levels), and at least every max_skip frames
+    regardless. threshold 0 classifies every frame. The reference only
+    moves when classified is called, so a changed crop that never made
+    it to the model is not taken for classified
+    """
+
+    def __init__(self, threshold=4.0, step=16, max_skip=30):
+        self.threshold = threshold
+        self.step      = step
+        self.max_skip  = max_skip
+        self.reference = None
+        self.since     = 0
+        self.checked   = 0
+        self.skipped   = 0
+
+    def sample(self, crop):
+        return crop[::self.step, ::self.step].astype(np.int16)
+
+    def changed(self, sample):
+        self.checked += 1
+        reference = self.reference
+        if (self.threshold > 0 and reference is not None and reference.shape == sample.shape
+                and self.since < self.max_skip and np.abs(sample - reference).mean() <= self.threshold):
+            self.since   += 1
+            self.skipped += 1
+            return False
+        return True
+
+    def classified(self, sample):
+        self.reference = sample
+        self.since     = 0
+
+
+class Smoother(object):
+    """
+    The stable gesture over the recent classifications. majority: the
+    gesture most of the last window frames were classified as; ema: the
+    gesture with the highest exponential moving average probability,
+    which has to lead the current one by margin to replace it; none: the
+    gesture of the last frame
+    """
+
+    def __init__(self, labels, mode="majority", window=5, alpha=0.3, margin=0.1):
+        if mode not in SMOOTHING:
+            raise ValueError("unknown smoothing {}".format(mode))
+        self.labels  = labels
+        self.mode    = mode
+        self.alpha   = alpha
+        self.margin  = margin
+        self.recent  = collections.deque(maxlen=window)
+        self.average = None
+        self.index   = None
+
+    def update(self, classification):
+        """
+        Adds a frame's class probabilities. Returns the stable gesture
+        and its confidence, or (None, None) until there is one. None adds
+        nothing and returns the gesture as it stands
+        """
+        if classification is None:
+            if self.index is None:
+                return None, None
+            if self.mode == "majority":
+                return self.labels[self.index], float(np.mean([c[self.index] for c in self.recent]))
+            if self.mode == "ema":
+                return self.labels[self.index], self.average[self.index]
+            return self.labels[self.index], self.recent[-1][self.index]
+        classification = np.asarray(classification, dtype=np.float64)
+        self.recent.append(classification)
+        if self.mode == "none":
+            self.index = int(np.argmax(classification))
+            return self.labels[self.index], classification[self.index]
+        if self.mode == "majority":
+            votes = np.bincount([int(np.argmax(c)) for c in self.recent], minlength=len(self.labels))
+            best  = int(np.argmax(votes))
+            if 2 * votes[best] > len(self.recent):
+                self.index = best
+            if self.index is None:
+                return None, None
+            return self.labels[self.index], float(np.mean([c[self.index] for c in self.recent]))
+        if self.average is None:
+            self.average = classification.copy()
+        else:
+            self.average += self.alpha * (classification - self.average)
+        best = int(np.argmax(self.average))
+        if self.index is None or self.average[best] > self.average[self.index] + self.margin:
+            self.index = best
+        return self.labels[self.index], self.average[self.index]
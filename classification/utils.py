@@ -23,6 +23,9 @@ CAP_COLOR = (255,0,0)
 PREDICT_TEXT_REGION_X = CAP_REGION_X
 PREDICT_TEXT_REGION_Y = int(CAP_REGION_BOTTOM + 0.05*FRAME_W)
 
+# the precisions models.py can write a model in
+PRECISIONS = ['float32', 'float16', 'int8']
+
 MODEL_DICT = {
     'simple': {
         'data_file': 'data',
@@ -33,12 +36,14 @@ MODEL_DICT = {
     'vgg': {
         'data_file': 'data',
         'model_file': 'model/vgg16_fully_connect_layer.h5',
+        'fused_file': 'model/vgg16_fused.h5',
         'width': 64,
         'height': 64,
     },
     'mobilenet': {
         'data_file': 'data',
         'model_file': 'model/mobilenet.h5',
+        'fused_file': 'model/mobilenet_fused.h5',
         'width': 128,
         'height': 128,
     }